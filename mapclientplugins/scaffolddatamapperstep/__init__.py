@@ -8,9 +8,15 @@ __author__ = 'Mahyar Osanlouy'
 __stepname__ = 'Scaffold Data Mapper'
 __location__ = ''
 
-# import class that derives itself from the step mountpoint.
-from mapclientplugins.scaffolddatamapperstep import step
+try:
+    # import class that derives itself from the step mountpoint.
+    from mapclientplugins.scaffolddatamapperstep import step
 
-# Import the resource file when the module is loaded,
-# this enables the framework to use the step icon.
-from . import resources_rc
\ No newline at end of file
+    # Import the resource file when the module is loaded,
+    # this enables the framework to use the step icon.
+    from . import resources_rc
+except ImportError as e:
+    # Without PySide and the MAP Client only the models and the headless batch command line are available.
+    # Any other missing module is a real error in the step, so it is not hidden.
+    if (e.name or '').split('.')[0] not in ('PySide', 'mapclient'):
+        raise
\ No newline at end of file
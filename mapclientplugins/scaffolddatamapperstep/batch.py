@@ -0,0 +1,285 @@
+"""
+Headless batch mapping of many subjects, without PySide or the MAP Client.
+
+Usage::
+
+    python -m mapclientplugins.scaffolddatamapperstep.batch manifest.json -o output
+
+The manifest is a JSON list of subjects, each an object with 'scaffold' and 'data' file paths, optional 'ephys'
+and 'name' entries, and an optional 'alignment': either a saved alignment file written by a previous run or
+an inline 4x4 transformation matrix. Subjects without an alignment are aligned automatically. Relative paths are
+taken from the manifest's directory.
+
+With --workers subjects are spread over a process pool, each worker building every subject in one reused Zinc
+context. If a worker process dies, for example running out of memory, the subjects pending in the pool are
+retried once in a new pool before being reported as failed. A checkpoint marker is written for each completed
+subject and later runs skip those subjects, so an interrupted run resumes where it stopped.
+"""
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+from opencmiss.zinc.context import Context
+
+from mapclientplugins.scaffolddatamapperstep.model.mastermodel import MasterModel
+from mapclientplugins.scaffolddatamapperstep.utils.datacache import get_user_cache_directory
+
+ALIGNMENT_FILE_SUFFIX = '_alignment.json'
+MAPPING_FILE_SUFFIX = '_mapping.csv'
+SCAFFOLD_FILE_SUFFIX = '_scaffold.exf'
+CHECKPOINT_FILE_SUFFIX = '.done'
+# Subjects submitted to the pool per worker ahead of completion; bounds the memory held by pending tasks.
+TASKS_PER_WORKER = 2
+# Times a subject is submitted before it is reported as failed, when worker processes die while it is pending.
+MAX_SUBJECT_ATTEMPTS = 2
+
+# Zinc context of the current worker process, created by the first subject it runs.
+_worker_context = None
+
+
+def read_manifest(manifest_path):
+    """
+    :return: List of subject dicts with absolute file paths and a unique name.
+    """
+    with open(manifest_path) as f:
+        entries = json.load(f)
+    if not isinstance(entries, list):
+        raise ValueError('Manifest {0} must contain a list of subjects'.format(manifest_path))
+    base_directory = os.path.dirname(os.path.abspath(manifest_path))
+    subjects = []
+    names = set()
+    for index, entry in enumerate(entries):
+        if ('scaffold' not in entry) or ('data' not in entry):
+            raise ValueError('Manifest subject {0} needs both scaffold and data paths'.format(index))
+        subject = dict(entry)
+        for key in ['scaffold', 'data', 'ephys']:
+            if subject.get(key) is not None:
+                subject[key] = os.path.join(base_directory, subject[key])
+        alignment = subject.get('alignment')
+        if (alignment is not None) and not isinstance(alignment, list):
+            subject['alignment'] = os.path.join(base_directory, alignment)
+        if 'name' not in subject:
+            subject['name'] = os.path.splitext(os.path.basename(subject['data']))[0]
+        if subject['name'] in names:
+            raise ValueError('Duplicate subject name {0} in manifest'.format(subject['name']))
+        names.add(subject['name'])
+        subjects.append(subject)
+    return subjects
+
+
+def read_alignment(alignment):
+    """
+    :param alignment: Saved alignment file path, or a 4x4 matrix as nested lists.
+    :return: 4x4 transformation matrix.
+    """
+    if not isinstance(alignment, list):
+        with open(alignment) as f:
+            alignment = json.load(f)['transformation']
+    matrix = np.asarray(alignment, dtype=np.float64)
+    if matrix.shape != (4, 4):
+        raise ValueError('Alignment must be a 4x4 transformation matrix')
+    return matrix
+
+
+def write_alignment(file_path, matrix, residuals=None):
+    with open(file_path, 'w') as f:
+        json.dump(dict(transformation=np.asarray(matrix).tolist(), residuals=residuals), f, indent=4)
+
+
+def write_mapped_locations(file_path, data_identifiers, element_identifiers, xi):
+    with open(file_path, 'w') as f:
+        writer = csv.writer(f)
+        writer.writerow(['datapoint', 'element'] + ['xi{0}'.format(i + 1) for i in range(xi.shape[1])])
+        for identifier, element, location in zip(data_identifiers.tolist(), element_identifiers.tolist(),
+                                                 xi.tolist()):
+            writer.writerow([identifier, element] + location)
+
+
+def get_checkpoint_path(output_directory, subject):
+    return os.path.join(output_directory, subject['name'] + CHECKPOINT_FILE_SUFFIX)
+
+
+def is_subject_complete(output_directory, subject):
+    return os.path.isfile(get_checkpoint_path(output_directory, subject))
+
+
+def write_checkpoint(output_directory, subject, summary):
+    """
+    Mark a subject as complete once all its outputs are written. The marker is written under a temporary name
+    and renamed, so a partial marker is never taken as a completed subject.
+    """
+    checkpoint_path = get_checkpoint_path(output_directory, subject)
+    temporary_path = checkpoint_path + '.tmp'
+    with open(temporary_path, 'w') as f:
+        json.dump(summary, f, indent=4)
+    os.rename(temporary_path, checkpoint_path)
+
+
+def process_subject(subject, output_directory, options, context=None):
+    """
+    Load one subject, align the scaffold to its data from a saved or automatic alignment, map the datapoints
+    onto the scaffold and write the aligned scaffold, alignment and mapping to output_directory.
+
+    :param options: Parsed command line options.
+    :param context: Optional Zinc context to reuse, otherwise the model creates its own.
+    :return: Dict summarising the outputs.
+    """
+    start = time.time()
+    model = MasterModel(subject['scaffold'], subject['data'], subject.get('ephys'),
+                        cache_directory=options.cache_directory, context=context)
+    residuals = None
+    if subject.get('alignment') is not None:
+        model.set_scaffold_transformation_matrix(read_alignment(subject['alignment']))
+    else:
+        residuals = model.auto_align(samples_per_xi=options.samples_per_xi, voxel_size=options.voxel_size,
+                                     levels=options.levels, time_budget=options.time_budget)
+    data_identifiers, element_identifiers, xi = model.map_data_automatically(options.samples_per_xi,
+                                                                             not options.no_refine)
+    prefix = os.path.join(output_directory, subject['name'])
+    write_alignment(prefix + ALIGNMENT_FILE_SUFFIX, model.get_scaffold_transformation_matrix(), residuals)
+    write_mapped_locations(prefix + MAPPING_FILE_SUFFIX, data_identifiers, element_identifiers, xi)
+    model.write_scaffold(prefix + SCAFFOLD_FILE_SUFFIX)
+    summary = dict(name=subject['name'], datapoints=len(data_identifiers), seconds=time.time() - start)
+    write_checkpoint(output_directory, subject, summary)
+    return summary
+
+
+def _run_subject(subject, output_directory, options):
+    """
+    Process a subject in the worker's Zinc context, created by the first subject the worker runs. Failures
+    are returned rather than raised so they are reported with the subject.
+
+    :return: Subject, summary dict or None, error message or None.
+    """
+    global _worker_context
+    if _worker_context is None:
+        _worker_context = Context('ScaffoldDataMapper')
+    try:
+        return subject, process_subject(subject, output_directory, options, _worker_context), None
+    except Exception as e:
+        return subject, None, str(e)
+
+
+def run_subjects(subjects, output_directory, options, result_callback):
+    """
+    Process subjects serially in this process, or over a pool of options.workers processes with at most
+    TASKS_PER_WORKER pending tasks per worker.
+
+    :param result_callback: Callable(subject, summary, error) called once for each subject as it completes
+    or fails.
+    """
+    if options.workers <= 1:
+        for subject in subjects:
+            result_callback(*_run_subject(subject, output_directory, options))
+        return
+    queue = [(subject, 1) for subject in reversed(subjects)]
+    while queue:
+        # A dead worker breaks the whole pool; the subjects still pending in it are queued again in a new one.
+        queue = _run_pool(queue, output_directory, options, result_callback)
+
+
+def _run_pool(queue, output_directory, options, result_callback):
+    """
+    Run the queued subjects over a new process pool until they are done or a worker process dies.
+
+    :param queue: List of (subject, attempt) consumed from the end.
+    :return: List of (subject, attempt) still to run after a worker process died.
+    """
+    pending = {}
+    retry = []
+
+    def _collect(futures):
+        for future in futures:
+            subject, attempt = pending.pop(future)
+            try:
+                result = future.result()
+            except BrokenProcessPool:
+                if attempt < MAX_SUBJECT_ATTEMPTS:
+                    retry.append((subject, attempt + 1))
+                else:
+                    result_callback(subject, None, 'worker process died')
+            except Exception as e:
+                # Failures outside process_subject, such as sending the task to the worker.
+                result_callback(subject, None, str(e))
+            else:
+                result_callback(*result)
+
+    executor = ProcessPoolExecutor(options.workers)
+    try:
+        while (queue or pending) and not retry:
+            if queue and (len(pending) < options.workers * TASKS_PER_WORKER):
+                try:
+                    future = executor.submit(_run_subject, queue[-1][0], output_directory, options)
+                except BrokenProcessPool:
+                    break
+                pending[future] = queue.pop()
+            else:
+                _collect(wait(pending, return_when=FIRST_COMPLETED).done)
+        # Every pending task fails once the pool is broken, so this only waits on running subjects otherwise.
+        _collect(wait(pending).done)
+    except KeyboardInterrupt:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
+        raise
+    executor.shutdown()
+    return queue + retry
+
+
+def create_argument_parser():
+    parser = argparse.ArgumentParser(description='Map data onto scaffolds for every subject in a manifest.')
+    parser.add_argument('manifest', help='JSON manifest of scaffold, data and ephys files per subject')
+    parser.add_argument('-o', '--output-directory', default='.', help='directory to write the results to')
+    parser.add_argument('--cache-directory', default=get_user_cache_directory(),
+                        help='binary cache directory for parsed data files, default the per-user cache')
+    parser.add_argument('--samples-per-xi', type=int, default=4,
+                        help='mesh samples along each xi direction used for alignment and mapping')
+    parser.add_argument('--voxel-size', type=float, default=None,
+                        help='finest voxel size for automatic alignment, default full resolution')
+    parser.add_argument('--levels', type=int, default=3, help='pyramid levels for automatic alignment')
+    parser.add_argument('--time-budget', type=float, default=None,
+                        help='time limit in seconds for automatic alignment of each subject')
+    parser.add_argument('--no-refine', action='store_true',
+                        help='map to the nearest mesh sample without refining the element location')
+    parser.add_argument('-j', '--workers', type=int, default=1,
+                        help='number of worker processes, 0 for one per CPU core')
+    parser.add_argument('--restart', action='store_true',
+                        help='process every subject again, ignoring the checkpoints of earlier runs')
+    return parser
+
+
+def main(argv=None):
+    options = create_argument_parser().parse_args(argv)
+    if options.workers == 0:
+        options.workers = multiprocessing.cpu_count()
+    subjects = read_manifest(options.manifest)
+    if not os.path.isdir(options.output_directory):
+        os.makedirs(options.output_directory)
+    if not options.restart:
+        completed = [subject for subject in subjects if is_subject_complete(options.output_directory, subject)]
+        if completed:
+            print('Skipping {0} subjects completed by an earlier run'.format(len(completed)))
+            subjects = [subject for subject in subjects if subject not in completed]
+    failures = []
+
+    def _report(subject, summary, error):
+        if error is not None:
+            failures.append(subject['name'])
+            sys.stderr.write('{0}: failed: {1}\n'.format(subject['name'], error))
+        else:
+            print('{name}: mapped {datapoints} datapoints in {seconds:.1f} s'.format(**summary))
+
+    run_subjects(subjects, options.output_directory, options, _report)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,23 +1,107 @@
+import numpy as np
+
 from opencmiss.zinc.field import Field
 from opencmiss.zinc.glyph import Glyph
 from opencmiss.zinc.material import Material
+from opencmiss.zinc.spectrum import Spectrumcomponent
 from opencmiss.zinc.status import OK as ZINC_OK
 from opencmiss.utils.maths import vectorops as maths
 
+from .ephysmodel import EphysModel
+from ..utils.datacache import DataCache
+from ..utils.exreader import ExStreamReader, ExFormatError
+from ..utils.exwriter import DatapointWriter, write_datapoints
+
+# Largest estimated number of visible datapoints drawn with each glyph; beyond the last, plain points are used.
+LEVELS_OF_DETAIL = [(20000, Glyph.SHAPE_TYPE_SPHERE), (200000, Glyph.SHAPE_TYPE_DIAMOND)]
+POINT_RENDER_SIZE = 2.0
+
+
+class DataPointBlock(object):
+    """
+    Coordinates of a fixed set of datapoints gathered once into an array, so the whole set can be
+    transformed with one matrix product and written back in a single change block.
+    """
+
+    def __init__(self, coordinate_field, nodeset):
+        self._field = coordinate_field
+        self._number_of_components = coordinate_field.getNumberOfComponents()
+        self._nodes = []
+        node_iter = nodeset.createNodeiterator()
+        node = node_iter.next()
+        while node.isValid():
+            self._nodes.append(node)
+            node = node_iter.next()
+        values, self._identifiers = DataModel.get_field_values(coordinate_field, nodeset)
+        self._coordinates = np.zeros((len(self._nodes), 3), dtype=np.float64)
+        self._coordinates[:, :self._number_of_components] = values
+
+    def get_size(self):
+        return len(self._nodes)
+
+    def get_identifiers(self):
+        return self._identifiers
+
+    def get_coordinates(self):
+        """
+        :return: (N, 3) array of the coordinates gathered when the block was created.
+        """
+        return self._coordinates
+
+    def get_centroid(self):
+        return np.nanmean(self._coordinates, axis=0)
+
+    def transform(self, matrix):
+        """
+        Set the datapoints to their gathered coordinates transformed by a 4x4 affine matrix.
+
+        :return: True on success, otherwise False.
+        """
+        matrix = np.asarray(matrix, dtype=np.float64)
+        transformed = self._coordinates.dot(matrix[:3, :3].T) + matrix[:3, 3]
+        return self.set_coordinates(transformed)
+
+    def set_coordinates(self, coordinates):
+        """
+        :param coordinates: (N, 3) array in the order of the gathered nodes.
+        :return: True on success, otherwise False.
+        """
+        success = True
+        values_list = coordinates[:, :self._number_of_components].tolist()
+        fm = self._field.getFieldmodule()
+        fm.beginChange()
+        cache = fm.createFieldcache()
+        for node, values in zip(self._nodes, values_list):
+            cache.setNode(node)
+            if self._field.assignReal(cache, values) != ZINC_OK:
+                success = False
+        fm.endChange()
+        return success
+
 
 class DataModel(object):
 
-    def __init__(self, region, material_module, ex_file_path, ephys_file_path=None):
+    def __init__(self, region, material_module, ex_file_path, ephys_file_path=None, progress_callback=None,
+                 cache_directory=None):
         self._region = region
+        self._progress_callback = progress_callback
+        self._data_cache = None if cache_directory is None else DataCache(cache_directory)
         self._material_module = material_module
         self._ex_file_path = ex_file_path
         self._ephys_file_path = ephys_file_path if ephys_file_path is not None else None
         self._data_coordinate_field = None
+        self._scalar_spectrum = None
+        self._scalar_fields = {}
+        self._cached_coordinates = None
+        self._ephys_model = None if ephys_file_path is None else EphysModel(ephys_file_path, cache_directory)
 
         self._initialise_point_material()
         self._initialise_scene()
         self._initialise_ex_data()
 
+    def get_ephys_model(self):
+        return self._ephys_model
+
     def _identify_data_type(self):
         pass
 
@@ -25,6 +109,9 @@ class DataModel(object):
         self._scene = self._region.getScene()
 
     def _initialise_point_material(self):
+        if self._material_module.findMaterialByName('cell_purple').isValid():
+            # Already defined by an earlier model in a shared context.
+            return
         self._material_module.beginChange()
         cell_purple = self._material_module.createMaterial()
         cell_purple.setName('cell_purple')
@@ -44,23 +131,143 @@ class DataModel(object):
             raise ValueError('Scaffold scene is not initialised.')
 
     def _create_data_point_graphics(self):
+        self._data_size = self._get_data_size()
+        self._point_size = 0.25 * self._data_size
         points = self._scene.createGraphicsPoints()
         points.setFieldDomainType(Field.DOMAIN_TYPE_DATAPOINTS)
         points.setCoordinateField(self._data_coordinate_field)
-        point_attr = points.getGraphicspointattributes()
-        point_attr.setGlyphShapeType(Glyph.SHAPE_TYPE_SPHERE)
-        point_size = self._get_auto_point_size()
-        point_attr.setBaseSize(point_size)
         points.setMaterial(self._material_module.findMaterialByName('cell_purple'))
         points.setName('display_points')
+        self._level_of_detail = None
+        self.update_level_of_detail()
+
+    def _get_level_of_detail(self, view_size):
+        """
+        Estimate how many points are on screen from the datapoint count and the fraction of the cloud the
+        view covers, and pick the cheapest glyph that still reads well at that density.
+        """
+        fm = self._region.getFieldmodule()
+        count = fm.findNodesetByFieldDomainType(Field.DOMAIN_TYPE_DATAPOINTS).getSize()
+        if (view_size is not None) and (self._data_size > 0.0):
+            count *= min(1.0, (view_size / self._data_size) ** 2)
+        for maximum_count, glyph_shape_type in LEVELS_OF_DETAIL:
+            if count <= maximum_count:
+                return glyph_shape_type
+        return Glyph.SHAPE_TYPE_POINT
+
+    def update_level_of_detail(self, view_size=None):
+        """
+        Switch the datapoint glyph for the current zoom. Graphics are only changed when the level changes.
+
+        :param view_size: Width of the visible part of the scene in model units, None for the whole cloud.
+        """
+        points = self._scene.findGraphicsByName('display_points')
+        if not points.isValid():
+            return
+        level_of_detail = self._get_level_of_detail(view_size)
+        if level_of_detail == self._level_of_detail:
+            return
+        self._level_of_detail = level_of_detail
+        self._scene.beginChange()
+        point_attr = points.getGraphicspointattributes()
+        point_attr.setGlyphShapeType(level_of_detail)
+        if level_of_detail == Glyph.SHAPE_TYPE_POINT:
+            point_attr.setBaseSize(1.0)
+            points.setRenderPointSize(POINT_RENDER_SIZE)
+        else:
+            point_attr.setBaseSize(self._point_size)
+        self._scene.endChange()
+
+    def _get_scalar_spectrum(self):
+        if self._scalar_spectrum is None:
+            spectrum_module = self._scene.getSpectrummodule()
+            spectrum_module.beginChange()
+            self._scalar_spectrum = spectrum_module.createSpectrum()
+            self._scalar_spectrum.setName('data_scalar')
+            self._scalar_spectrum.setManaged(True)
+            component = self._scalar_spectrum.createSpectrumcomponent()
+            component.setColourMappingType(Spectrumcomponent.COLOUR_MAPPING_TYPE_RAINBOW)
+            spectrum_module.endChange()
+        return self._scalar_spectrum
+
+    def set_data_point_field(self, field, value_range=None):
+        """
+        Colour the data points by a scalar field.
+
+        :param value_range: Optional (minimum, maximum) of the spectrum, otherwise ranged on the values shown.
+        """
+        points = self._scene.findGraphicsByName('display_points')
+        if not points.isValid():
+            return
+        spectrum = self._get_scalar_spectrum()
+        self._scene.beginChange()
+        points.setDataField(field)
+        points.setSpectrum(spectrum)
+        if value_range is None:
+            spectrum.autorange(self._scene, self._scene.getScenefiltermodule().getDefaultScenefilter())
+        else:
+            component = spectrum.getFirstSpectrumcomponent()
+            component.setRangeMinimum(float(value_range[0]))
+            component.setRangeMaximum(float(value_range[1]))
+        self._scene.endChange()
+
+    def set_point_scalar_values(self, name, values, identifiers=None):
+        """
+        Colour the data points by an array of scalar values, such as ephys amplitude, expression or fit error.
+        Values go into a datapoint field named name in one change block; on later calls with the same name
+        only the values that differ from the previous call are written.
+
+        :param values: (N,) array of values.
+        :param identifiers: (N,) array of datapoint identifiers, defaults to the datapoints in iteration order.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        fm = self._region.getFieldmodule()
+        datapoints = fm.findNodesetByFieldDomainType(Field.DOMAIN_TYPE_DATAPOINTS)
+        scalar = self._scalar_fields.get(name)
+        if (scalar is None) or (identifiers is not None and not np.array_equal(identifiers, scalar['identifiers'])):
+            if identifiers is None:
+                _, identifiers = self.get_field_values(self._data_coordinate_field)
+            nodes = [datapoints.findNodeByIdentifier(int(identifier)) for identifier in identifiers]
+            field = fm.findFieldByName(name).castFiniteElement() if scalar is None else scalar['field']
+            if not field.isValid():
+                field = fm.createFieldFiniteElement(1)
+                field.setName(name)
+                field.setManaged(True)
+            scalar = {'field': field, 'identifiers': np.array(identifiers), 'nodes': nodes, 'values': None}
+            self._scalar_fields[name] = scalar
+        previous = scalar['values']
+        if previous is None:
+            changed = np.arange(len(values))
+        else:
+            changed = np.flatnonzero((values != previous) & ~(np.isnan(values) & np.isnan(previous)))
+        if len(changed):
+            field = scalar['field']
+            nodes = scalar['nodes']
+            fm.beginChange()
+            if previous is None:
+                node_template = datapoints.createNodetemplate()
+                node_template.defineField(field)
+            cache = fm.createFieldcache()
+            for index, value in zip(changed.tolist(), values[changed].tolist()):
+                node = nodes[index]
+                if not node.isValid():
+                    continue
+                if previous is None:
+                    node.merge(node_template)
+                cache.setNode(node)
+                field.assignReal(cache, value)
+            fm.endChange()
+        scalar['values'] = values.copy()
+        finite = values[np.isfinite(values)]
+        value_range = (finite.min(), finite.max()) if len(finite) else None
+        self.set_data_point_field(scalar['field'], value_range)
 
     def create_data_graphics(self):
         self._create_data_point_graphics()
 
-    def _get_auto_point_size(self):
+    def _get_data_size(self):
         minimums, maximums = self._get_data_range()
-        data_size = maths.magnitude(maths.sub(maximums, minimums))
-        return 0.25 * data_size
+        return maths.magnitude(maths.sub(maximums, minimums))
 
     def _get_data_range(self):
         fm = self._region.getFieldmodule()
@@ -86,13 +293,59 @@ class DataModel(object):
         return minimums, maximums
 
     def _initialise_ex_data(self):
+        if not self._load_cached_ex_data():
+            self._stream_ex_data()
+        self._data_coordinate_field = self._get_data_coordinate_field()
+
+    def _load_cached_ex_data(self):
+        if self._data_cache is None:
+            return False
+        entry = self._data_cache.load(self._ex_file_path)
+        if entry is None:
+            return False
+        metadata, identifiers, coordinates = entry
+        write_datapoints(self._region, metadata['field_name'], metadata['component_names'], metadata['group_name'],
+                         identifiers, coordinates, metadata['groups'], progress_callback=self._progress_callback)
+        return True
+
+    def _stream_ex_data(self):
+        cache_writer = None if self._data_cache is None else self._data_cache.create_writer(self._ex_file_path)
+        reader = ExStreamReader(self._ex_file_path, progress_callback=self._progress_callback)
+        writer = None
+        try:
+            for identifiers, coordinates in reader.iterate_batches():
+                if writer is None:
+                    writer = DatapointWriter(self._region, *reader.get_field_definition())
+                writer.write(identifiers, coordinates)
+                if cache_writer is not None:
+                    cache_writer.append(identifiers, coordinates)
+            writer.write_groups(reader.get_groups())
+        except ExFormatError:
+            self._discard_stream(writer, cache_writer)
+            # Not a plain point cloud: use the complete Zinc reader.
+            self._read_ex_data()
+            return
+        except Exception:
+            self._discard_stream(writer, cache_writer)
+            raise
+        if cache_writer is not None:
+            field_name, component_names, group_name = reader.get_field_definition()
+            cache_writer.commit(field_name, component_names, group_name, reader.get_groups())
+
+    @staticmethod
+    def _discard_stream(writer, cache_writer):
+        if writer is not None:
+            writer.discard()
+        if cache_writer is not None:
+            cache_writer.discard()
+
+    def _read_ex_data(self):
         sir = self._region.createStreaminformationRegion()
         point_cloud_resource = sir.createStreamresourceFile(self._ex_file_path)
         sir.setResourceDomainTypes(point_cloud_resource, Field.DOMAIN_TYPE_DATAPOINTS)
         result = self._region.read(sir)
         if result != ZINC_OK:
             raise ValueError('Failed to initiate EX data.')
-        self._data_coordinate_field = self._get_data_coordinate_field()
 
     def _get_data_coordinate_field(self):
         fm = self._region.getFieldmodule()
@@ -112,21 +365,103 @@ class DataModel(object):
         raise ValueError('Could not determine data coordinate field')
 
     @staticmethod
-    def get_data_location(field):
-        locations_list = list()
+    def get_field_values(field, nodeset=None):
+        """
+        Evaluate a field at every node of a nodeset or nodeset group into preallocated arrays.
+
+        :param field: Field to evaluate.
+        :param nodeset: Nodeset or nodeset group, defaults to all datapoints in the field's region.
+        :return: (N, components) float array, with NaN where the field is not defined, and the matching
+        (N,) array of node identifiers.
+        """
         fm = field.getFieldmodule()
-        fm.beginChange()
+        if nodeset is None:
+            nodeset = fm.findNodesetByFieldDomainType(Field.DOMAIN_TYPE_DATAPOINTS)
+        number_of_components = field.getNumberOfComponents()
+        size = nodeset.getSize()
+        values = np.full((size, number_of_components), np.nan, dtype=np.float64)
+        identifiers = np.empty(size, dtype=np.int32)
         cache = fm.createFieldcache()
-        datapoints = fm.findNodesetByFieldDomainType(Field.DOMAIN_TYPE_DATAPOINTS)
-        node_iter = datapoints.createNodeiterator()
+        node_iter = nodeset.createNodeiterator()
         node = node_iter.next()
+        index = 0
         while node.isValid():
             cache.setNode(node)
-            _, coordinates = field.evaluateReal(cache, 3)
-            locations_list.append(coordinates)
+            result, node_values = field.evaluateReal(cache, number_of_components)
+            if result == ZINC_OK:
+                values[index] = node_values
+            identifiers[index] = node.getIdentifier()
+            index += 1
             node = node_iter.next()
+        return values, identifiers
+
+    @staticmethod
+    def get_data_location(field):
+        values, _ = DataModel.get_field_values(field)
+        return values.tolist()
+
+    def get_data_coordinates(self, nodeset=None):
+        """
+        :param nodeset: Optional datapoint nodeset group, defaults to all datapoints.
+        :return: (N, 3) array of datapoint coordinates and the matching array of datapoint identifiers.
+        """
+        values, identifiers = self.get_field_values(self._data_coordinate_field, nodeset)
+        number_of_components = values.shape[1]
+        if number_of_components < 3:
+            values = np.hstack([values, np.zeros((values.shape[0], 3 - number_of_components))])
+        return values, identifiers
+
+    def get_number_of_data_points(self):
+        fm = self._region.getFieldmodule()
+        return fm.findNodesetByFieldDomainType(Field.DOMAIN_TYPE_DATAPOINTS).getSize()
+
+    def get_cached_data_coordinates(self):
+        """
+        :return: Coordinates and identifiers of all datapoints, gathered once until invalidated by an edit.
+        """
+        if self._cached_coordinates is None:
+            self._cached_coordinates = self.get_data_coordinates()
+        return self._cached_coordinates
+
+    def invalidate_data_coordinates(self):
+        self._cached_coordinates = None
+
+    def create_data_point_block(self, nodeset):
+        """
+        :param nodeset: Datapoint nodeset or nodeset group to gather.
+        :return: DataPointBlock over the datapoint coordinates of nodeset.
+        """
+        return DataPointBlock(self._data_coordinate_field, nodeset)
+
+    def select_data_points(self, selection_group, identifiers, add=False):
+        """
+        Put the datapoints with the given identifiers in the selection group, in one change block.
+
+        :param add: Add to the current selection instead of replacing it.
+        """
+        fm = self._region.getFieldmodule()
+        datapoints = fm.findNodesetByFieldDomainType(Field.DOMAIN_TYPE_DATAPOINTS)
+        fm.beginChange()
+        if not add:
+            selection_group.clear()
+        node_group = selection_group.getFieldNodeGroup(datapoints)
+        if not node_group.isValid():
+            node_group = selection_group.createFieldNodeGroup(datapoints)
+        nodeset_group = node_group.getNodesetGroup()
+        for identifier in identifiers.tolist():
+            nodeset_group.addNode(datapoints.findNodeByIdentifier(identifier))
         fm.endChange()
-        return locations_list
+
+    def get_selection_nodeset_group(self, selection_group):
+        """
+        :return: The datapoint nodeset group of a selection group field, or None if it has none.
+        """
+        fm = self._region.getFieldmodule()
+        datapoints = fm.findNodesetByFieldDomainType(Field.DOMAIN_TYPE_DATAPOINTS)
+        node_group = selection_group.getFieldNodeGroup(datapoints)
+        if not node_group.isValid():
+            return None
+        return node_group.getNodesetGroup()
 
     def get_data_id(self, field):
         return
@@ -0,0 +1,132 @@
+import csv
+import hashlib
+import json
+import os
+import tempfile
+
+from ..utils.columnstore import ColumnStore, ColumnStoreWriter
+from ..utils.datacache import DataCache
+
+DEFAULT_CHUNK_ROWS = 65536
+TIME_COLUMN_NAMES = ['time', 't']
+
+
+class EphysModel(object):
+    """
+    Electrophysiology recordings from CSV, TSV or JSON files, converted in chunks to a columnar store of
+    typed per-channel arrays. Conversion happens on first use and each channel is only memory-mapped when
+    requested, so recordings need not fit in memory.
+    """
+
+    def __init__(self, file_path, cache_directory=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+        self._file_path = file_path
+        self._cache_directory = cache_directory
+        self._chunk_rows = chunk_rows
+        self._store = None
+
+    def _get_store_directory(self):
+        cache_directory = self._cache_directory
+        if cache_directory is None:
+            cache_directory = os.path.join(tempfile.gettempdir(), 'scaffolddatamapper-ephys')
+        key = hashlib.sha1(os.path.abspath(self._file_path).encode('utf-8')).hexdigest()
+        return os.path.join(cache_directory, 'ephys', key)
+
+    def _get_store(self):
+        if self._store is None:
+            directory = self._get_store_directory()
+            fingerprint = DataCache.get_fingerprint(self._file_path)
+            if ColumnStore.exists(directory):
+                store = ColumnStore(directory)
+                if store.get_metadata().get('fingerprint') == fingerprint:
+                    self._store = store
+                    return store
+            # An outdated store is replaced once the conversion completes.
+            self._convert(directory, {'fingerprint': fingerprint})
+            self._store = ColumnStore(directory)
+        return self._store
+
+    def _convert(self, directory, metadata):
+        _, extension = os.path.splitext(self._file_path)
+        if extension.lower() == '.json':
+            self._convert_json(directory, metadata)
+        else:
+            self._convert_delimited(directory, metadata, '\t' if extension.lower() == '.tsv' else ',')
+
+    def _convert_delimited(self, directory, metadata, delimiter):
+        with open(self._file_path, 'r') as stream:
+            reader = csv.reader(stream, delimiter=delimiter)
+            column_names = [name.strip() for name in next(reader)]
+            writer = self._create_writer(directory, column_names, metadata)
+            try:
+                rows = []
+                for row in reader:
+                    if not row:
+                        continue
+                    rows.append(row)
+                    if len(rows) == self._chunk_rows:
+                        writer.append(_rows_to_columns(rows, len(column_names)))
+                        rows = []
+                if rows:
+                    writer.append(_rows_to_columns(rows, len(column_names)))
+            except Exception:
+                writer.discard()
+                raise
+            writer.close()
+
+    def _convert_json(self, directory, metadata):
+        # The standard library has no streaming JSON parser: the document is loaded once, then written out
+        # in chunks so later access is columnar and lazy.
+        with open(self._file_path, 'r') as stream:
+            content = json.load(stream)
+        if isinstance(content, dict):
+            column_names = list(content.keys())
+            # An object of single values is one sample of every channel.
+            columns = [content[name] if isinstance(content[name], list) else [content[name]]
+                       for name in column_names]
+        elif isinstance(content, list):
+            column_names = list(content[0].keys()) if content else []
+            columns = [[record.get(name) for record in content] for name in column_names]
+        else:
+            raise ValueError('Ephys JSON must be an object of channel arrays or a list of records.')
+        count = len(columns[0]) if columns else 0
+        if any(len(column) != count for column in columns):
+            raise ValueError('Ephys JSON channels must all have the same number of samples.')
+        writer = self._create_writer(directory, column_names, metadata)
+        try:
+            for start in range(0, count, self._chunk_rows):
+                writer.append([column[start:start + self._chunk_rows] for column in columns])
+        except Exception:
+            writer.discard()
+            raise
+        writer.close()
+
+    @staticmethod
+    def _create_writer(directory, column_names, metadata):
+        float64_columns = [name for name in column_names if name.lower() in TIME_COLUMN_NAMES]
+        return ColumnStoreWriter(directory, column_names, float64_columns=float64_columns, metadata=metadata)
+
+    def get_channel_names(self):
+        return [name for name in self._get_store().get_column_names() if name.lower() not in TIME_COLUMN_NAMES]
+
+    def get_channel(self, name):
+        """
+        :return: Memory-mapped array of the channel values.
+        """
+        return self._get_store().get_column(name)
+
+    def get_times(self):
+        """
+        :return: Array of sample times from the time column, or None if the file has none.
+        """
+        store = self._get_store()
+        for name in store.get_column_names():
+            if name.lower() in TIME_COLUMN_NAMES:
+                return store.get_column(name)
+        return None
+
+    def get_number_of_samples(self):
+        return self._get_store().get_row_count()
+
+
+def _rows_to_columns(rows, number_of_columns):
+    return [[row[c].strip() if c < len(row) else '' for row in rows] for c in range(number_of_columns)]
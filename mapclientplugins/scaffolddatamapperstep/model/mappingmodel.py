@@ -0,0 +1,95 @@
+import numpy as np
+from scipy.spatial import cKDTree
+
+from opencmiss.zinc.field import FieldFindMeshLocation
+
+# Nearest mesh samples whose elements are searched when refining a location, so points near element boundaries
+# also search the neighbouring elements.
+REFINE_CANDIDATE_SAMPLES = 8
+# Element identifier reported for datapoints without coordinates, whose xi are NaN.
+UNMAPPED_ELEMENT_IDENTIFIER = -1
+
+
+class MappingModel(object):
+    """
+    Maps datapoints to their nearest location on the scaffold mesh as an element and xi.
+    Candidates come from a KD-tree over points sampled on a regular xi grid in every element, which are
+    then refined with a Zinc nearest find mesh location search restricted to the elements of the nearest few
+    samples, keeping the closest location over those elements.
+    """
+
+    def __init__(self, scaffold_model, data_model):
+        self._scaffold_model = scaffold_model
+        self._data_model = data_model
+        self._data_identifiers = None
+        self._element_identifiers = None
+        self._xi = None
+
+    def map_data(self, samples_per_xi=5, refine=True):
+        """
+        :param samples_per_xi: Number of sample points along each xi direction of every element.
+        :param refine: If False only the nearest sample location is used, without the Zinc refinement.
+        :return: datapoint identifiers, element identifiers, xi arrays. Datapoints without coordinates are
+        unmapped, with element UNMAPPED_ELEMENT_IDENTIFIER and NaN xi.
+        """
+        coordinates, self._data_identifiers = self._data_model.get_data_coordinates()
+        sample_points, sample_elements, sample_xi = self._scaffold_model.get_mesh_samples(samples_per_xi)
+        self._element_identifiers = np.full(len(coordinates), UNMAPPED_ELEMENT_IDENTIFIER, dtype=sample_elements.dtype)
+        self._xi = np.full((len(coordinates), sample_xi.shape[1]), np.nan, dtype=sample_xi.dtype)
+        defined = np.flatnonzero(np.isfinite(coordinates).all(axis=1))
+        if len(defined) == 0:
+            return self._data_identifiers, self._element_identifiers, self._xi
+        tree = cKDTree(sample_points)
+        candidate_count = min(REFINE_CANDIDATE_SAMPLES, len(sample_points)) if refine else 1
+        _, nearest = tree.query(coordinates[defined], k=candidate_count)
+        nearest = nearest.reshape(len(defined), candidate_count)
+        self._element_identifiers[defined] = sample_elements[nearest[:, 0]]
+        self._xi[defined] = sample_xi[nearest[:, 0]]
+        if refine:
+            self._refine_locations(coordinates, defined, sample_elements[nearest])
+        return self._data_identifiers, self._element_identifiers, self._xi
+
+    def _refine_locations(self, coordinates, point_indexes, candidate_elements):
+        """
+        :param point_indexes: (N,) indexes of the datapoints to refine into coordinates.
+        :param candidate_elements: (N, K) identifiers of the elements to search for each of those datapoints.
+        """
+        mesh = self._scaffold_model.get_mesh()
+        dimension = mesh.getDimension()
+        coordinate_field = self._scaffold_model.get_coordinate_field()
+        fm = coordinate_field.getFieldmodule()
+        fm.beginChange()
+        source_field = fm.createFieldConstant([0.0] * coordinate_field.getNumberOfComponents())
+        candidate_group = fm.createFieldGroup()
+        candidate_mesh_group = candidate_group.createFieldElementGroup(mesh).getMeshGroup()
+        find_mesh_location = fm.createFieldFindMeshLocation(source_field, coordinate_field, mesh)
+        find_mesh_location.setSearchMode(FieldFindMeshLocation.SEARCH_MODE_NEAREST)
+        find_mesh_location.setSearchMesh(candidate_mesh_group)
+        fm.endChange()
+        cache = fm.createFieldcache()
+        # Zinc evaluates one location at a time, so group the points by their set of candidate elements to
+        # change the search mesh once per set; most points have the same candidates as their neighbours.
+        candidate_sets, set_indexes = np.unique(np.sort(candidate_elements, axis=1), axis=0, return_inverse=True)
+        set_indexes = set_indexes.reshape(-1)
+        order = np.argsort(set_indexes, kind='mergesort')
+        boundaries = np.flatnonzero(np.diff(set_indexes[order])) + 1
+        for set_point_indexes in np.split(order, boundaries):
+            if len(set_point_indexes) == 0:
+                continue
+            candidate_mesh_group.removeAllElements()
+            for element_identifier in np.unique(candidate_sets[set_indexes[set_point_indexes[0]]]).tolist():
+                candidate_mesh_group.addElement(mesh.findElementByIdentifier(element_identifier))
+            for index in point_indexes[set_point_indexes].tolist():
+                cache.setFieldReal(source_field, coordinates[index].tolist())
+                # The nearest search over all candidate elements returns the location at minimum distance.
+                element, xi = find_mesh_location.evaluateMeshLocation(cache, dimension)
+                if element.isValid():
+                    self._element_identifiers[index] = element.getIdentifier()
+                    self._xi[index] = xi
+        del find_mesh_location
+        del candidate_mesh_group
+        del candidate_group
+        del source_field
+
+    def get_mapped_locations(self):
+        return self._data_identifiers, self._element_identifiers, self._xi
@@ -1,13 +1,33 @@
+import math
+
+import numpy as np
+
 from opencmiss.zinc.context import Context
 
+from ..utils import affine, registration
+from ..utils.screenselection import ScreenGridIndex, project_points
 from .scaffoldmodel import ScaffoldModel
 from .datamodel import DataModel
+from .mappingmodel import MappingModel
+from .rnaseqmodel import RnaSeqModel
+from .timesequencemodel import TimeSequenceModel
+
+# Approximate number of surface triangles drawn for the scaffold at full quality.
+TRIANGLE_BUDGET = 2000000
+# Approximate bytes per datapoint and per scaffold node parameter in Zinc, including graphics.
+DATAPOINT_MEMORY_ESTIMATE = 512
+NODE_PARAMETER_MEMORY_ESTIMATE = 256
 
 
 class MasterModel(object):
 
-    def __init__(self, scaffold_path, ex_data_path, ephys_data_path=None):
-        self._context = Context('ScaffoldDataMapper')
+    def __init__(self, scaffold_path, ex_data_path, ephys_data_path=None, progress_callback=None,
+                 cache_directory=None, context=None):
+        """
+        :param context: Optional Zinc context to build the regions in, so one context can be reused for many
+        subjects. A new context is created by default.
+        """
+        self._context = Context('ScaffoldDataMapper') if context is None else context
         self._material_module = self._context.getMaterialmodule()
         self._region = self._context.createRegion()
         self._region.setName('DataMapperRegion')
@@ -16,8 +36,16 @@ class MasterModel(object):
         self._ex_data_path = ex_data_path
         self._ephys_data_path = ephys_data_path if ephys_data_path is not None else None
 
-        self._scaffold_model = ScaffoldModel(self._region, self._material_module, self._scaffold_path)
-        self._data_model = DataModel(self._region, self._material_module, self._ex_data_path, self._ephys_data_path)
+        # The scaffold lives in a child region so its scene can be transformed independently of the data.
+        self._scaffold_region = self._region.createChild('scaffold')
+        self._scaffold_model = ScaffoldModel(self._scaffold_region, self._material_module, self._scaffold_path)
+        self._data_model = DataModel(self._region, self._material_module, self._ex_data_path, self._ephys_data_path,
+                                     progress_callback, cache_directory)
+        self._mapping_model = MappingModel(self._scaffold_model, self._data_model)
+        self._time_sequence_model = None
+        self._time_point_change_callback = None
+        self._rna_seq_model = None
+        self._data_modified = False
 
         self._initialise_glyph_material()
         self._initialise_tessellation(12)
@@ -49,22 +77,178 @@ class MasterModel(object):
     def get_model_Z_value(self):
         return self._scaffold_model.get_Z_value()
 
-    def get_selection_data_location(self, field):
-        locations = self._data_model.get_data_location(field)
-        return locations
+    def get_selection_data_location(self, selection_group):
+        """
+        :return: (N, 3) coordinates array and identifiers array of the datapoints in the selection group.
+        """
+        nodeset_group = self._data_model.get_selection_nodeset_group(selection_group)
+        if nodeset_group is None:
+            return np.zeros((0, 3)), np.zeros(0, dtype=np.int32)
+        return self._data_model.get_data_coordinates(nodeset_group)
+
+    def select_data_in_window(self, window_matrix, selection_group, box=None, lasso=None, add=False):
+        """
+        Select the datapoints inside a window rectangle or lasso by projecting the cached datapoint
+        coordinates to the screen and querying a pixel grid index.
+
+        :param window_matrix: 16 row-major values transforming world to Zinc window pixel top left coordinates.
+        :param box: (x1, y1, x2, y2) rectangle in mouse coordinates, with y increasing downward.
+        :param lasso: Sequence of (x, y) mouse coordinates of the lasso outline.
+        :param add: Add to the current selection instead of replacing it.
+        :return: Number of datapoints selected.
+        """
+        coordinates, identifiers = self._data_model.get_cached_data_coordinates()
+        window_points, in_front = project_points(window_matrix, coordinates)
+        index = ScreenGridIndex(window_points, in_front)
+        selected = index.query_box(*box) if box is not None else index.query_lasso(lasso)
+        self._data_model.select_data_points(selection_group, identifiers[selected], add)
+        return len(selected)
+
+    def create_selected_data_block(self, selection_group):
+        """
+        :return: DataPointBlock over the selected datapoints, or None if none are selected.
+        """
+        nodeset_group = self._data_model.get_selection_nodeset_group(selection_group)
+        if (nodeset_group is None) or (nodeset_group.getSize() == 0):
+            return None
+        return self._data_model.create_data_point_block(nodeset_group)
+
+    def transform_selected_data(self, selection_group, matrix, about_centroid=True):
+        """
+        Move all selected datapoints by a 4x4 affine matrix in one gather, transform and write back.
+
+        :param about_centroid: Apply the linear part about the centroid of the selection rather than the origin.
+        :return: True on success, otherwise False.
+        """
+        block = self.create_selected_data_block(selection_group)
+        if block is None:
+            return False
+        matrix = np.asarray(matrix, dtype=np.float64)
+        if about_centroid:
+            centroid = block.get_centroid()
+            matrix = affine.translation_matrix(centroid).dot(matrix).dot(affine.translation_matrix(-centroid))
+        result = block.transform(matrix)
+        self.data_points_edited()
+        return result
+
+    def data_points_edited(self):
+        self._data_model.invalidate_data_coordinates()
+        self._data_modified = True
+
+    def is_data_modified(self):
+        """
+        :return: True once datapoints have been moved, coloured or mapped, so the model no longer matches its
+        input files.
+        """
+        return self._data_modified
+
+    def get_memory_estimate(self):
+        """
+        :return: Rough number of bytes held by the scaffold and data regions.
+        """
+        return self._data_model.get_number_of_data_points() * DATAPOINT_MEMORY_ESTIMATE + \
+            self._scaffold_model.get_number_of_node_parameters() * NODE_PARAMETER_MEMORY_ESTIMATE
+
+    def get_data_coordinates(self):
+        return self._data_model.get_data_coordinates()
+
+    def get_ephys_model(self):
+        return self._data_model.get_ephys_model()
+
+    def has_time_sequence(self):
+        return self._data_model.get_ephys_model() is not None
+
+    def _get_time_sequence_model(self):
+        if self._time_sequence_model is None:
+            # Converts the ephys file to the columnar store the first time, so only done once time is used.
+            self._time_sequence_model = TimeSequenceModel(
+                self._region, self._context.getTimekeepermodule(), self._data_model.get_ephys_model())
+            self._time_sequence_model.set_frame_change_callback(self._time_point_changed)
+            # The current frame is loaded on construction, so the spectrum is ranged on real values.
+            self._data_model.set_data_point_field(self._time_sequence_model.get_field())
+        return self._time_sequence_model
+
+    def set_time_point_change_callback(self, time_point_change_callback):
+        """
+        :param time_point_change_callback: Callable(time_point) called whenever a different time point is shown,
+        including from time keeper changes made elsewhere.
+        """
+        self._time_point_change_callback = time_point_change_callback
+
+    def _time_point_changed(self, time_point):
+        if self._time_point_change_callback is not None:
+            self._time_point_change_callback(time_point)
+
+    def get_number_of_time_points(self):
+        return self._get_time_sequence_model().get_number_of_frames()
+
+    def set_time_point(self, time_point):
+        self._get_time_sequence_model().set_frame(time_point)
+
+    def advance_time_point(self, step=1):
+        model = self._get_time_sequence_model()
+        model.advance(step)
+        return model.get_current_frame()
+
+    def load_rna_seq(self, matrix_path, genes_path=None, cells_path=None):
+        """
+        :param matrix_path: Gene by cell expression matrix in Matrix Market (.mtx) or scipy sparse .npz format.
+        :param genes_path: Optional file of gene names, one per matrix row.
+        :param cells_path: Optional file of datapoint identifiers, one per matrix column.
+        """
+        self._rna_seq_model = RnaSeqModel(self._region, matrix_path, genes_path, cells_path)
+        self._data_modified = True
+
+    def get_gene_names(self):
+        return [] if self._rna_seq_model is None else self._rna_seq_model.get_gene_names()
+
+    def show_gene(self, gene):
+        expression = self._rna_seq_model.get_expression(gene)
+        value_range = (expression.min(), expression.max()) if len(expression) else None
+        self._data_model.set_data_point_field(self._rna_seq_model.get_gene_field(gene), value_range)
+
+    def colour_data_points(self, name, values, identifiers=None):
+        self._data_model.set_point_scalar_values(name, values, identifiers)
+        self._data_modified = True
+
+    def get_field_values(self, field, nodeset=None):
+        return self._data_model.get_field_values(field, nodeset)
 
     def initialise_graphics(self):
         self._scaffold_model.create_scaffold_graphics()
         self._data_model.create_data_graphics()
 
+    def update_data_level_of_detail(self, view_size):
+        self._data_model.update_level_of_detail(view_size)
+
+    def reset_view_state(self):
+        """
+        Return the state left by a previous view to that of a new model, before a reused model is shown by a
+        new view: the level of detail of the whole cloud, an empty selection, the first time point and no
+        callbacks into the previous view.
+        """
+        self._data_model.update_level_of_detail()
+        selection_group = self.get_scene().getSelectionField().castGroup()
+        if selection_group.isValid():
+            selection_group.clear()
+        self._time_point_change_callback = None
+        if self._time_sequence_model is not None:
+            self._time_sequence_model.set_frame(0)
+        self._scaffold_model.set_settings_change_callback(None)
+
     def _initialise_glyph_material(self):
         self._glyph_module = self._context.getGlyphmodule()
         self._glyph_module.defineStandardGlyphs()
 
     def _initialise_tessellation(self, res):
+        """
+        :param res: Maximum refinement factor, reduced to keep the scaffold surfaces within TRIANGLE_BUDGET.
+        """
         self._tessellationmodule = self._context.getTessellationmodule()
         self._tessellationmodule = self._tessellationmodule.getDefaultTessellation()
-        self._tessellationmodule.setRefinementFactors([res])
+        number_of_faces = self._scaffold_model.get_number_of_surface_elements()
+        budget_res = int(math.sqrt(TRIANGLE_BUDGET / (2.0 * max(1, number_of_faces))))
+        self._tessellationmodule.setRefinementFactors([max(1, min(res, budget_res))])
 
     def rotate_scaffold(self, angle, value):
         self._scaffold_model.rotate_scaffold(angle, value)
@@ -72,5 +256,59 @@ class MasterModel(object):
     def translate_scaffold(self, axis, value, rate):
         self._scaffold_model.translate_scaffold(axis, value, rate)
 
+    def transform_scaffold(self, angles=None, positions=None, rate=1):
+        self._scaffold_model.transform_scaffold(angles, positions, rate)
+
+    def set_scaffold_preview_mode(self, preview_mode):
+        self._scaffold_model.set_preview_mode(preview_mode)
+
+    def is_scaffold_preview_mode(self):
+        return self._scaffold_model.is_preview_mode()
+
+    def bake_scaffold_transformation(self):
+        self._scaffold_model.bake_transformation()
+
+    def reset_scaffold(self):
+        self._scaffold_model.reset_settings()
+
+    def auto_align(self, samples_per_xi=4, voxel_size=None, levels=3, time_budget=None, max_iterations=30,
+                   tolerance=1.0e-6, residual_callback=None):
+        """
+        Rigidly register the scaffold to the data cloud with coarse-to-fine iterative closest point and write
+        the fitted pose back through the scaffold settings, so the transformation controls show it.
+
+        :param voxel_size: Finest voxel size of the downsampling pyramid, None for full resolution.
+        :param levels: Number of pyramid levels.
+        :param time_budget: Optional time limit in seconds.
+        :param residual_callback: Optional callable(level, iteration, residual) reporting the RMS residual.
+        :return: List of RMS residual lists per pyramid level.
+        """
+        coordinates, _ = self._data_model.get_data_coordinates()
+        # Datapoints without coordinates take no part in the registration.
+        coordinates = coordinates[np.isfinite(coordinates).all(axis=1)]
+        samples, _, _ = self._scaffold_model.get_mesh_samples(samples_per_xi)
+        transformation, residuals = registration.multiresolution_icp(
+            samples, coordinates, voxel_size=voxel_size, levels=levels, time_budget=time_budget,
+            max_iterations=max_iterations, tolerance=tolerance, callback=residual_callback)
+        pose = transformation.dot(self._scaffold_model.get_transformation_matrix())
+        self._scaffold_model.set_transformation_matrix(pose)
+        return residuals
+
+    def get_scaffold_transformation_matrix(self):
+        return self._scaffold_model.get_transformation_matrix()
+
+    def set_scaffold_transformation_matrix(self, matrix):
+        self._scaffold_model.set_transformation_matrix(np.asarray(matrix, dtype=np.float64))
+
+    def write_scaffold(self, file_path):
+        self._scaffold_model.write_scaffold(file_path)
+
+    def map_data_automatically(self, samples_per_xi=5, refine=True):
+        self._data_modified = True
+        return self._mapping_model.map_data(samples_per_xi, refine)
+
+    def get_mapped_locations(self):
+        return self._mapping_model.get_mapped_locations()
+
     def set_model_settings_change_callback(self, settings_change_callback):
         self._scaffold_model.set_settings_change_callback(settings_change_callback)
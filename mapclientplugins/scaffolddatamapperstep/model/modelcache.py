@@ -0,0 +1,86 @@
+"""
+In-process cache of loaded MasterModels, so re-executing the step on unchanged inputs reuses the Zinc context,
+regions and graphics instead of reading the files again.
+"""
+import collections
+import os
+
+from ..utils.datacache import DataCache
+from .mastermodel import MasterModel
+
+DEFAULT_MEMORY_LIMIT = 1024 ** 3
+
+
+class MasterModelCache(object):
+    """
+    Least recently used cache of MasterModels keyed by the input file paths and their content fingerprints.
+    Models are evicted once their estimated total memory exceeds memory_limit; the most recently used model is
+    always kept. A model whose data was modified is replaced by a new one when next requested.
+    """
+
+    def __init__(self, memory_limit=DEFAULT_MEMORY_LIMIT):
+        self._memory_limit = memory_limit
+        self._entries = collections.OrderedDict()
+
+    @staticmethod
+    def _get_key(file_paths):
+        key = []
+        for file_path in file_paths:
+            if file_path is None:
+                key.append(None)
+            else:
+                fingerprint = DataCache.get_fingerprint(file_path)
+                key.append((os.path.abspath(file_path), fingerprint['size'], fingerprint['mtime'],
+                            fingerprint['hash']))
+        return tuple(key)
+
+    @staticmethod
+    def _get_paths(key):
+        return tuple(None if entry is None else entry[0] for entry in key)
+
+    def get_model(self, scaffold_path, ex_data_path, ephys_data_path=None, **kwargs):
+        """
+        :param kwargs: Further MasterModel arguments, only used when the model is created.
+        :return: The cached model for the inputs if their content is unchanged and its data was not modified,
+        with its view state reset, otherwise a new model, and whether the model was created.
+        """
+        key = self._get_key([scaffold_path, ex_data_path, ephys_data_path])
+        model = self._entries.pop(key, (None, 0))[0]
+        if (model is not None) and model.is_data_modified():
+            # Edited datapoints, scalar fields and mapping results must not carry over to a new execution.
+            model = None
+        created = model is None
+        if created:
+            # Entries for earlier contents of the same files can never be used again.
+            paths = self._get_paths(key)
+            for stale_key in [k for k in self._entries if self._get_paths(k) == paths]:
+                del self._entries[stale_key]
+            model = MasterModel(scaffold_path, ex_data_path, ephys_data_path, **kwargs)
+        else:
+            # The previous view's selection, time point and callbacks must not carry over.
+            model.reset_view_state()
+        self._entries[key] = (model, model.get_memory_estimate())
+        self._evict()
+        return model, created
+
+    def _evict(self):
+        total = sum(size for _, size in self._entries.values())
+        while (total > self._memory_limit) and (len(self._entries) > 1):
+            _, (_, size) = self._entries.popitem(last=False)
+            total -= size
+
+    def clear(self):
+        self._entries.clear()
+
+
+_master_model_cache = None
+
+
+def get_master_model_cache():
+    """
+    :return: The cache shared by all steps in this process.
+    """
+    global _master_model_cache
+    if _master_model_cache is None:
+        _master_model_cache = MasterModelCache()
+    return _master_model_cache
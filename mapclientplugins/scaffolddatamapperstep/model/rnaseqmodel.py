@@ -0,0 +1,146 @@
+import collections
+import os
+
+import numpy as np
+from scipy import io as sparse_io
+from scipy import sparse
+
+from opencmiss.zinc.field import Field
+from opencmiss.zinc.status import OK as ZINC_OK
+
+DEFAULT_GENE_FIELD_CACHE_SIZE = 8
+GENE_FIELD_NAME_PREFIX = 'expression_'
+
+
+class RnaSeqModel(object):
+    """
+    Gene by cell expression matrix kept in sparse CSR form, one row per gene. A Zinc field on the
+    datapoints is only created for genes being shown, and the most recently used gene fields are cached.
+    Cells are matched to datapoints by the identifiers in the cells file, or in datapoint order without one.
+    Genes sharing a symbol are kept distinct by suffixing repeats with .1, .2 and so on.
+    """
+
+    def __init__(self, region, matrix_path, genes_path=None, cells_path=None,
+                 cache_size=DEFAULT_GENE_FIELD_CACHE_SIZE):
+        self._region = region
+        self._cache_size = cache_size
+        self._gene_fields = collections.OrderedDict()
+        self._expression = self._read_matrix(matrix_path)
+        self._gene_names = _make_unique_names(self._read_names(genes_path, self._expression.shape[0]))
+        self._gene_indexes = dict((name, g) for g, name in enumerate(self._gene_names))
+        self._nodes = self._match_cells(cells_path)
+
+    @staticmethod
+    def _read_matrix(matrix_path):
+        if os.path.splitext(matrix_path)[1].lower() == '.npz':
+            matrix = sparse.load_npz(matrix_path)
+        else:
+            matrix = sparse_io.mmread(matrix_path)
+        return sparse.csr_matrix(matrix, dtype=np.float32)
+
+    @staticmethod
+    def _read_names(file_path, count):
+        if file_path is None:
+            return [str(index + 1) for index in range(count)]
+        with open(file_path, 'r') as stream:
+            names = [line.rstrip('\n').split('\t') for line in stream if line.strip()]
+        if len(names) != count:
+            raise ValueError('Expected {0} names in {1}, found {2}.'.format(count, file_path, len(names)))
+        # Use the gene symbol where the file gives both an id and a symbol.
+        return [fields[1] if len(fields) > 1 else fields[0] for fields in names]
+
+    def _match_cells(self, cells_path):
+        fm = self._region.getFieldmodule()
+        datapoints = fm.findNodesetByFieldDomainType(Field.DOMAIN_TYPE_DATAPOINTS)
+        number_of_cells = self._expression.shape[1]
+        nodes = []
+        if cells_path is None:
+            node_iter = datapoints.createNodeiterator()
+            node = node_iter.next()
+            while node.isValid() and (len(nodes) < number_of_cells):
+                nodes.append(node)
+                node = node_iter.next()
+        else:
+            for identifier in self._read_names(cells_path, number_of_cells):
+                nodes.append(datapoints.findNodeByIdentifier(int(identifier)))
+        # Cells without a datapoint are kept as None so columns still line up with the list.
+        nodes.extend([None] * (number_of_cells - len(nodes)))
+        return [node if (node is not None) and node.isValid() else None for node in nodes]
+
+    def get_gene_names(self):
+        return self._gene_names
+
+    def get_expression(self, gene):
+        """
+        :return: Dense float32 array of the expression of gene in every cell.
+        """
+        return self._expression.getrow(self._gene_indexes[gene]).toarray().ravel()
+
+    def get_gene_field(self, gene):
+        """
+        :return: Field on the datapoints holding the expression of gene, created on first use.
+        """
+        field = self._gene_fields.pop(gene, None)
+        if field is None:
+            field = self._create_gene_field(gene)
+            while len(self._gene_fields) >= self._cache_size:
+                _, evicted_field = self._gene_fields.popitem(last=False)
+                self._remove_gene_field(evicted_field)
+        self._gene_fields[gene] = field
+        return field
+
+    def _create_gene_field(self, gene):
+        fm = self._region.getFieldmodule()
+        datapoints = fm.findNodesetByFieldDomainType(Field.DOMAIN_TYPE_DATAPOINTS)
+        name = GENE_FIELD_NAME_PREFIX + gene
+        fm.beginChange()
+        # A field evicted from the cache lives on while graphics still use it, keeping its name, so reuse it.
+        field = fm.findFieldByName(name).castFiniteElement()
+        if not field.isValid():
+            field = fm.createFieldFiniteElement(1)
+            if field.setName(name) != ZINC_OK:
+                fm.endChange()
+                raise ValueError('Cannot create gene field {0}: the name is used by another field.'.format(name))
+        node_template = datapoints.createNodetemplate()
+        node_template.defineField(field)
+        cache = fm.createFieldcache()
+        values = self.get_expression(gene).tolist()
+        for node, value in zip(self._nodes, values):
+            if node is not None:
+                node.merge(node_template)
+                cache.setNode(node)
+                field.assignReal(cache, value)
+        fm.endChange()
+        return field
+
+    def _remove_gene_field(self, field):
+        fm = self._region.getFieldmodule()
+        datapoints = fm.findNodesetByFieldDomainType(Field.DOMAIN_TYPE_DATAPOINTS)
+        fm.beginChange()
+        node_template = datapoints.createNodetemplate()
+        node_template.undefineField(field)
+        for node in self._nodes:
+            if node is not None:
+                node.merge(node_template)
+        fm.endChange()
+
+
+def _make_unique_names(names):
+    """
+    :return: names with every repeat of a name suffixed by .1, .2 and so on, skipping suffixed names in use.
+    """
+    used = set(names)
+    repeats = {}
+    unique_names = []
+    for name in names:
+        if name not in repeats:
+            repeats[name] = 0
+            unique_names.append(name)
+            continue
+        unique_name = name
+        while unique_name in used:
+            repeats[name] += 1
+            unique_name = '{0}.{1}'.format(name, repeats[name])
+        used.add(unique_name)
+        unique_names.append(unique_name)
+    return unique_names
@@ -1,9 +1,12 @@
-from math import radians
+import itertools
+
+import numpy as np
+
 from opencmiss.zinc.graphics import Graphics
 from opencmiss.zinc.material import Material
 from opencmiss.zinc.status import OK as ZINC_OK
-from opencmiss.utils.maths import vectorops as maths
 
+from ..utils import affine
 from ..utils import zincutils
 
 
@@ -21,18 +24,21 @@ class ScaffoldModel(object):
 
         self._settings = dict(yaw=0.0, pitch=0.0, roll=0.0, X=0.0, Y=0.0, Z=0.0)
         self._settings_change_callback = None
-        self._current_angle_value = [0., 0., 0.]
-        self._current_axis_value = [0., 0., 0.]
+        self._transformation_matrix = affine.identity()
+        self._baked_transformation = affine.identity()
+        self._preview_mode = False
 
     def reset_settings(self):
         self._settings = dict(yaw=0.0, pitch=0.0, roll=0.0, X=0.0, Y=0.0, Z=0.0)
+        self._update_transformation()
         self._apply_callback()
 
     def set_settings_change_callback(self, settings_change_callback):
         self._settings_change_callback = settings_change_callback
 
     def _apply_callback(self):
-        self._settings_change_callback()
+        if self._settings_change_callback is not None:
+            self._settings_change_callback()
 
     def get_yaw_value(self):
         return self._settings['yaw']
@@ -115,6 +121,9 @@ class ScaffoldModel(object):
             raise ValueError('Scaffold scene is not initialised.')
 
     def _initialise_surface_material(self):
+        if self._material_module.findMaterialByName('trans_blue').isValid():
+            # Already defined by an earlier model in a shared context.
+            return
         self._material_module.beginChange()
 
         trans_blue = self._material_module.createMaterial()
@@ -175,6 +184,65 @@ class ScaffoldModel(object):
         if result != ZINC_OK:
             raise ValueError('Failed to initiate scaffold')
         self._scaffold_coordinate_field = self._get_model_coordinate_field()
+        # The node parameter layout is indexed once and reused by every transform, reset and export.
+        self._node_layout = zincutils.NodeParameterLayout(self._scaffold_coordinate_field)
+        # Pristine copy of the node parameters: every pose is computed from it in a single transform so
+        # repeated edits never accumulate floating point error.
+        self._original_node_parameters = self._node_layout.gather()
+        if self._original_node_parameters is None:
+            raise ValueError('Failed to read scaffold node parameters')
+
+    def get_mesh(self):
+        return self._get_mesh()
+
+    def get_number_of_node_parameters(self):
+        return self._node_layout.get_size()
+
+    def get_number_of_surface_elements(self):
+        """
+        :return: Number of 2D elements drawn by surface graphics, estimated when faces are not defined.
+        """
+        mesh = self._get_mesh()
+        if mesh.getDimension() == 2:
+            return mesh.getSize()
+        fm = self._region.getFieldmodule()
+        faces = fm.findMeshByDimension(2).getSize()
+        return faces if faces > 0 else 6 * mesh.getSize()
+
+    def get_mesh_samples(self, samples_per_xi):
+        """
+        Evaluate the scaffold coordinates on a regular xi grid, including the element boundaries, in every
+        element of the highest dimension mesh.
+
+        :param samples_per_xi: Number of samples along each xi direction.
+        :return: (M, 3) sample coordinates, (M,) element identifiers, (M, dimension) xi arrays.
+        """
+        mesh = self._get_mesh()
+        dimension = mesh.getDimension()
+        coordinate_field = self.get_coordinate_field()
+        number_of_components = coordinate_field.getNumberOfComponents()
+        xi_values = np.linspace(0.0, 1.0, samples_per_xi)
+        xi_grid = np.array(list(itertools.product(xi_values, repeat=dimension)))[:, ::-1]
+        xi_list = xi_grid.tolist()
+        samples_per_element = len(xi_list)
+        number_of_samples = mesh.getSize() * samples_per_element
+        points = np.zeros((number_of_samples, 3), dtype=np.float64)
+        element_identifiers = np.empty(number_of_samples, dtype=np.int32)
+        fm = self._region.getFieldmodule()
+        cache = fm.createFieldcache()
+        sample = 0
+        element_iter = mesh.createElementiterator()
+        element = element_iter.next()
+        while element.isValid():
+            element_identifiers[sample:sample + samples_per_element] = element.getIdentifier()
+            for xi in xi_list:
+                cache.setMeshLocation(element, xi)
+                result, values = coordinate_field.evaluateReal(cache, number_of_components)
+                if result == ZINC_OK:
+                    points[sample, :number_of_components] = values
+                sample += 1
+            element = element_iter.next()
+        return points, element_identifiers, np.tile(xi_grid, (mesh.getSize(), 1))
 
     def _get_mesh(self):
         fm = self._region.getFieldmodule()
@@ -201,65 +269,101 @@ class ScaffoldModel(object):
             field = field_iter.next()
         raise ValueError('Could not determine model coordinate field')
 
-    def rotate_scaffold(self, angle, value):
-        next_angle_value = value
-        if angle == 'yaw':
-            if next_angle_value > self._current_angle_value[0]:
-                angle_value = next_angle_value - self._current_angle_value[0]
-            else:
-                angle_value = -(self._current_angle_value[0] - next_angle_value)
-            euler_angles = [angle_value, 0., 0.]
-            self._current_angle_value[0] = next_angle_value
-            self._settings['yaw'] = next_angle_value
-        elif angle == 'pitch':
-            if next_angle_value > self._current_angle_value[1]:
-                angle_value = next_angle_value - self._current_angle_value[1]
-            else:
-                angle_value = -(self._current_angle_value[1] - next_angle_value)
-            euler_angles = [0., angle_value, 0.]
-            self._current_angle_value[1] = next_angle_value
-            self._settings['pitch'] = next_angle_value
+    def _get_settings_transformation(self):
+        angles = [self._settings['yaw'], self._settings['pitch'], self._settings['roll']]
+        offset = [self._settings['X'], self._settings['Y'], self._settings['Z']]
+        return affine.translation_matrix(offset).dot(affine.rotation_matrix(angles))
+
+    def _update_transformation(self):
+        """
+        Recompute the absolute scaffold pose from the settings. In preview mode the pose is only shown as a
+        scene transformation, otherwise it is written to the coordinate field straight away.
+        """
+        self._transformation_matrix = self._get_settings_transformation()
+        if self._preview_mode:
+            self._update_scene_transformation()
         else:
-            if next_angle_value > self._current_angle_value[2]:
-                angle_value = next_angle_value - self._current_angle_value[2]
-            else:
-                angle_value = -(self._current_angle_value[2] - next_angle_value)
-            euler_angles = [0., 0., angle_value]
-            self._current_angle_value[2] = next_angle_value
-            self._settings['roll'] = next_angle_value
-        angles = euler_angles
-        angles = [radians(x) for x in angles]
-        rotation = maths.eulerToRotationMatrix3(angles)
-        zincutils.transform_coordinates(self._scaffold_coordinate_field, rotation)
+            self.bake_transformation()
+
+    def _get_unbaked_transformation(self):
+        return self._transformation_matrix.dot(np.linalg.inv(self._baked_transformation))
+
+    def _update_scene_transformation(self):
+        unbaked = self._get_unbaked_transformation()
+        if affine.is_identity(unbaked):
+            self._scene.clearTransformation()
+        else:
+            self._scene.setTransformationMatrix(affine.to_zinc_matrix(unbaked))
+
+    def bake_transformation(self):
+        """
+        Write the current pose, computed from the original node parameters, to the coordinate field and clear
+        the scene transformation. Must be called before anything uses scaffold coordinates.
+        """
+        if not np.array_equal(self._transformation_matrix, self._baked_transformation):
+            parameters = zincutils.transform_node_parameters(
+                self._node_layout, self._original_node_parameters, self._transformation_matrix)
+            self._node_layout.scatter(parameters)
+        self._baked_transformation = self._transformation_matrix.copy()
+        self._scene.clearTransformation()
+
+    def is_preview_mode(self):
+        return self._preview_mode
+
+    def set_preview_mode(self, preview_mode):
+        """
+        In preview mode pose edits move the scaffold scene on the graphics card without touching node
+        parameters, so surfaces are not re-tessellated. Leaving preview mode bakes the current pose.
+        """
+        self._preview_mode = preview_mode
+        if not preview_mode:
+            self.bake_transformation()
+
+    def get_coordinate_field(self):
+        self.bake_transformation()
+        return self._scaffold_coordinate_field
+
+    def get_transformation_matrix(self):
+        return self._transformation_matrix
+
+    def set_transformation_matrix(self, matrix):
+        """
+        Set the settings from a rigid 4x4 pose, for example one fitted by registration, and apply it.
+        """
+        yaw, pitch, roll = affine.euler_angles(matrix)
+        self._settings.update(yaw=yaw, pitch=pitch, roll=roll, X=matrix[0, 3], Y=matrix[1, 3], Z=matrix[2, 3])
+        self._update_transformation()
+        self._apply_callback()
+
+    def write_scaffold(self, file_path):
+        """
+        Write the scaffold region, with the current pose baked into its coordinates, to an EX file.
+        """
+        self.bake_transformation()
+        result = self._region.writeFile(file_path)
+        if result != ZINC_OK:
+            raise ValueError('Failed to write scaffold to {0}'.format(file_path))
+
+    def rotate_scaffold(self, angle, value):
+        self._settings[angle] = value
+        self._update_transformation()
         self._apply_callback()
 
     def translate_scaffold(self, axis, value, rate):
-        next_axis_value = value * rate
-
-        if axis == 'X':
-            if next_axis_value > self._current_axis_value[0]:
-                axis_value = next_axis_value - self._current_axis_value[0]
-            else:
-                axis_value = -(self._current_axis_value[0] - next_axis_value)
-            new_coordinates = [axis_value, 0., 0.]
-            self._current_axis_value[0] = next_axis_value
-            self._settings['X'] = next_axis_value
-        elif axis == 'Y':
-            if next_axis_value > self._current_axis_value[1]:
-                axis_value = next_axis_value - self._current_axis_value[1]
-            else:
-                axis_value = -(self._current_axis_value[1] - next_axis_value)
-            new_coordinates = [0., axis_value, 0.]
-            self._current_axis_value[1] = next_axis_value
-            self._settings['Y'] = next_axis_value
-        else:
-            if next_axis_value > self._current_axis_value[2]:
-                axis_value = next_axis_value - self._current_axis_value[2]
-            else:
-                axis_value = -(self._current_axis_value[2] - next_axis_value)
-            new_coordinates = [0., 0., axis_value]
-            self._current_axis_value[2] = next_axis_value
-            self._settings['Z'] = next_axis_value
-        offset = new_coordinates
-        zincutils.offset_scaffold(self._scaffold_coordinate_field, offset)
+        self._settings[axis] = value * rate
+        self._update_transformation()
+        self._apply_callback()
+
+    def transform_scaffold(self, angles=None, positions=None, rate=1):
+        """
+        Set any number of rotation and translation settings and apply the resulting pose once.
+
+        :param angles: Dict of new yaw, pitch and/or roll values.
+        :param positions: Dict of new X, Y and/or Z control values; the offset set is the value times rate.
+        """
+        for angle, value in (angles or {}).items():
+            self._settings[angle] = value
+        for axis, value in (positions or {}).items():
+            self._settings[axis] = value * rate
+        self._update_transformation()
         self._apply_callback()
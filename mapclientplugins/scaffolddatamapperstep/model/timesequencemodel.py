@@ -0,0 +1,179 @@
+import numpy as np
+
+from opencmiss.zinc.field import Field
+from opencmiss.zinc.timekeeper import Timekeepermoduleevent
+
+DEFAULT_RING_BUFFER_FRAMES = 64
+TIME_SEQUENCE_FIELD_NAME = 'ephys_value'
+
+
+class FrameRingBuffer(object):
+    """
+    Fixed capacity buffer of frames, each a row of channel values, addressed by frame index.
+    A frame always occupies slot frame % capacity, so newer frames overwrite older ones.
+    """
+
+    def __init__(self, capacity, number_of_channels):
+        self._capacity = capacity
+        self._values = np.zeros((capacity, number_of_channels), dtype=np.float32)
+        self._frames = np.full(capacity, -1, dtype=np.int64)
+
+    def get_capacity(self):
+        return self._capacity
+
+    def contains(self, frame):
+        return self._frames[frame % self._capacity] == frame
+
+    def get(self, frame):
+        return self._values[frame % self._capacity] if self.contains(frame) else None
+
+    def put_block(self, start, values):
+        """
+        :param values: (frames, channels) array of consecutive frames starting at frame start.
+        """
+        for offset in range(len(values)):
+            slot = (start + offset) % self._capacity
+            self._values[slot] = values[offset]
+            self._frames[slot] = start + offset
+
+
+class TimeSequenceModel(object):
+    """
+    Time-varying ephys channel values on the datapoints. Channels are matched to datapoints by identifier
+    and stored in a Zinc time-sequence field; the time keeper selects the time shown, and the frame at each
+    new time keeper time is loaded from a time keeper notifier, whoever changed the time. Frames are read from
+    the columnar ephys store a block at a time into a ring buffer ahead of the play position, and each frame
+    is written to the field only the first time it is shown.
+    """
+
+    def __init__(self, region, timekeepermodule, ephys_model, ring_buffer_frames=DEFAULT_RING_BUFFER_FRAMES):
+        self._region = region
+        self._timekeeper = timekeepermodule.getDefaultTimekeeper()
+        self._ephys_model = ephys_model
+        self._frame_change_callback = None
+        times = ephys_model.get_times()
+        number_of_frames = ephys_model.get_number_of_samples()
+        self._times = np.arange(number_of_frames, dtype=np.float64) if times is None else np.asarray(times)
+        self._frames_loaded = np.zeros(number_of_frames, dtype=bool)
+        self._current_frame = 0
+        self._field = None
+        self._nodes = []
+        self._channel_names = []
+        self._initialise_field()
+        self._ring_buffer = FrameRingBuffer(ring_buffer_frames, len(self._channel_names))
+        if number_of_frames > 0:
+            self._timekeeper.setMinimumTime(float(self._times[0]))
+            self._timekeeper.setMaximumTime(float(self._times[-1]))
+            self._show_frame(self._get_frame_at_time(self._timekeeper.getTime()))
+        self._notifier = timekeepermodule.createTimekeepermodulenotifier()
+        self._notifier.setCallback(self._timekeeper_event)
+
+    def _initialise_field(self):
+        fm = self._region.getFieldmodule()
+        datapoints = fm.findNodesetByFieldDomainType(Field.DOMAIN_TYPE_DATAPOINTS)
+        for name in self._ephys_model.get_channel_names():
+            try:
+                node = datapoints.findNodeByIdentifier(int(name))
+            except ValueError:
+                continue
+            if node.isValid():
+                self._nodes.append(node)
+                self._channel_names.append(name)
+        fm.beginChange()
+        self._field = fm.createFieldFiniteElement(1)
+        self._field.setName(TIME_SEQUENCE_FIELD_NAME)
+        self._field.setManaged(True)
+        if self._nodes and len(self._times):
+            time_sequence = fm.getMatchingTimesequence(self._times.tolist())
+            node_template = datapoints.createNodetemplate()
+            node_template.defineField(self._field)
+            node_template.setTimesequence(self._field, time_sequence)
+            for node in self._nodes:
+                node.merge(node_template)
+        fm.endChange()
+
+    def get_field(self):
+        return self._field
+
+    def get_number_of_frames(self):
+        return len(self._times)
+
+    def get_current_frame(self):
+        return self._current_frame
+
+    def set_frame_change_callback(self, frame_change_callback):
+        """
+        :param frame_change_callback: Callable(frame) called whenever a different frame is shown.
+        """
+        self._frame_change_callback = frame_change_callback
+
+    def _get_frame_at_time(self, time):
+        """
+        :return: The last frame at or before time, clamped to the sequence.
+        """
+        frame = int(np.searchsorted(self._times, time, side='right')) - 1
+        return max(0, min(frame, self.get_number_of_frames() - 1))
+
+    def _timekeeper_event(self, event):
+        if (event.getChangeFlags() & Timekeepermoduleevent.CHANGE_FLAG_TIME) and self.get_number_of_frames():
+            self._show_frame(self._get_frame_at_time(self._timekeeper.getTime()))
+
+    def _prefetch(self, start):
+        """
+        Read the block of frames from start into the ring buffer with one contiguous read per channel.
+        """
+        end = min(start + self._ring_buffer.get_capacity(), self.get_number_of_frames())
+        block = np.empty((end - start, len(self._channel_names)), dtype=np.float32)
+        for c, name in enumerate(self._channel_names):
+            block[:, c] = self._ephys_model.get_channel(name)[start:end]
+        self._ring_buffer.put_block(start, block)
+
+    def _load_frame(self, frame):
+        if self._frames_loaded[frame] or not self._nodes:
+            return
+        values = self._ring_buffer.get(frame)
+        if values is None:
+            self._prefetch(frame)
+            values = self._ring_buffer.get(frame)
+        fm = self._region.getFieldmodule()
+        fm.beginChange()
+        cache = fm.createFieldcache()
+        cache.setTime(float(self._times[frame]))
+        for node, value in zip(self._nodes, values.tolist()):
+            cache.setNode(node)
+            self._field.assignReal(cache, value)
+        fm.endChange()
+        self._frames_loaded[frame] = True
+
+    def _show_frame(self, frame):
+        """
+        Load the frame into the field if needed, and refill the ring buffer ahead of it once the next frame is
+        no longer buffered.
+        """
+        self._load_frame(frame)
+        next_frame = frame + 1
+        if (next_frame < self.get_number_of_frames()) and not self._frames_loaded[next_frame] and \
+                not self._ring_buffer.contains(next_frame):
+            self._prefetch(next_frame)
+        if frame != self._current_frame:
+            self._current_frame = frame
+            if self._frame_change_callback is not None:
+                self._frame_change_callback(frame)
+
+    def set_frame(self, frame):
+        """
+        Show the given frame by moving the time keeper to its time.
+        """
+        if not self.get_number_of_frames():
+            return
+        frame = max(0, min(frame, self.get_number_of_frames() - 1))
+        # Loaded here too, as the time keeper does not notify when its time is unchanged.
+        self._show_frame(frame)
+        self._timekeeper.setTime(float(self._times[frame]))
+
+    def advance(self, step=1):
+        """
+        Move playback on by step frames, wrapping at the end of the sequence.
+        """
+        if self.get_number_of_frames():
+            self.set_frame((self._current_frame + step) % self.get_number_of_frames())
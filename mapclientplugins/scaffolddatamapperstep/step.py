@@ -7,13 +7,15 @@ import json
 from PySide import QtGui
 
 from mapclient.mountpoints.workflowstep import WorkflowStepMountPoint
-from mapclientplugins.scaffolddatamapperstep.configuredialog import ConfigureDialog
-from mapclientplugins.scaffolddatamapperstep.model.mastermodel import MasterModel
-from mapclientplugins.scaffolddatamapperstep.view.scaffolddatamapperwidget import ScaffoldDataMapperWidget
 
+# The configure dialog, models and widgets, and through them opencmiss.zinc, numpy and scipy, are imported when
+# the step is first configured or executed, so loading the plugin stays cheap for workflows that do not use it.
 
 EX_FILE_FORMATS = ['.exf', '.ex2', '.ex', '.exdata', 'exnode']
 EPHYS_FILE_FORMATS = ['.csv', '.tsv', '.json']
+PROGRESS_STEPS = 100
+# Loads finishing sooner than this never show the progress dialog.
+PROGRESS_DELAY_MS = 500
 
 
 class ScaffoldDataMapperStep(WorkflowStepMountPoint):
@@ -60,6 +62,10 @@ class ScaffoldDataMapperStep(WorkflowStepMountPoint):
         """
         # Put your execute step code here before calling the '_doneExecution' method.
         if self._view is None:
+            from mapclientplugins.scaffolddatamapperstep.model.modelcache import get_master_model_cache
+            from mapclientplugins.scaffolddatamapperstep.utils.datacache import get_user_cache_directory
+            from mapclientplugins.scaffolddatamapperstep.view.scaffolddatamapperwidget import \
+                ScaffoldDataMapperWidget
 
             _, ex_file_extension = os.path.splitext(self._ex_data_file_path)
             if ex_file_extension in EX_FILE_FORMATS:
@@ -67,9 +73,8 @@ class ScaffoldDataMapperStep(WorkflowStepMountPoint):
             else:
                 raise TypeError('Invalid EX data format.')
 
-            _, ephys_file_extension = os.path.splitext(self._ephys_data_file_path)
-
             if self._ephys_data_file_path is not None:
+                _, ephys_file_extension = os.path.splitext(self._ephys_data_file_path)
                 if ephys_file_extension in EPHYS_FILE_FORMATS:
                     ephys_file_path = self._ephys_data_file_path
                 else:
@@ -78,8 +83,23 @@ class ScaffoldDataMapperStep(WorkflowStepMountPoint):
             else:
                 ephys_file_path = None
 
-            self._model = MasterModel(self._scaffold_file_path, ex_file_path, ephys_file_path)
-            self._model.initialise_graphics()
+            cache_directory = get_user_cache_directory()
+            progress_dialog = QtGui.QProgressDialog('Loading data...', None, 0, PROGRESS_STEPS, self._main_window)
+            progress_dialog.setMinimumDuration(PROGRESS_DELAY_MS)
+
+            def _progress(done, total):
+                progress_dialog.setValue(int(PROGRESS_STEPS * done / max(1, total)))
+                QtGui.QApplication.processEvents()
+
+            try:
+                # Unchanged inputs reuse the model, with its graphics, from an earlier execution.
+                self._model, created = get_master_model_cache().get_model(
+                    self._scaffold_file_path, ex_file_path, ephys_file_path, progress_callback=_progress,
+                    cache_directory=cache_directory)
+            finally:
+                progress_dialog.close()
+            if created:
+                self._model.initialise_graphics()
             self._view = ScaffoldDataMapperWidget(self._model)
             self._view.register_done_execution(self._myDoneExecution)
 
@@ -125,6 +145,7 @@ class ScaffoldDataMapperStep(WorkflowStepMountPoint):
         then set:
             self._configured = True
         """
+        from mapclientplugins.scaffolddatamapperstep.configuredialog import ConfigureDialog
         dlg = ConfigureDialog(self._main_window)
         dlg.identifierOccursCount = self._identifierOccursCount
         dlg.setConfig(self._config)
@@ -165,6 +186,7 @@ class ScaffoldDataMapperStep(WorkflowStepMountPoint):
         """
         self._config.update(json.loads(string))
 
+        from mapclientplugins.scaffolddatamapperstep.configuredialog import ConfigureDialog
         d = ConfigureDialog()
         d.identifierOccursCount = self._identifierOccursCount
         d.setConfig(self._config)
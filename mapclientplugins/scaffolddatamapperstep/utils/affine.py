@@ -0,0 +1,62 @@
+"""
+Helpers for building and composing 4x4 homogeneous affine transformation matrices.
+"""
+from math import atan2, degrees, radians
+
+import numpy as np
+
+from opencmiss.utils.maths import vectorops as maths
+
+
+def identity():
+    return np.identity(4)
+
+
+def rotation_matrix(euler_angles):
+    """
+    :param euler_angles: [yaw, pitch, roll] in degrees.
+    :return: 4x4 affine matrix rotating about the origin.
+    """
+    matrix = np.identity(4)
+    matrix[:3, :3] = maths.eulerToRotationMatrix3([radians(x) for x in euler_angles])
+    return matrix
+
+
+def euler_angles(matrix):
+    """
+    Inverse of rotation_matrix, for the eulerToRotationMatrix3 convention.
+
+    :param matrix: 4x4 affine matrix with a pure rotation in its linear part.
+    :return: [yaw, pitch, roll] in degrees.
+    """
+    rotation = np.asarray(matrix)[:3, :3]
+    # eulerToRotationMatrix3 puts cos(pitch) times [cos(yaw), sin(yaw), -tan(pitch)] in the first row.
+    yaw = atan2(rotation[0, 1], rotation[0, 0])
+    pitch = atan2(-rotation[0, 2], np.hypot(rotation[1, 2], rotation[2, 2]))
+    roll = atan2(rotation[1, 2], rotation[2, 2])
+    return [degrees(yaw), degrees(pitch), degrees(roll)]
+
+
+def translation_matrix(offset):
+    """
+    :param offset: [X, Y, Z] offset.
+    :return: 4x4 affine matrix translating by offset.
+    """
+    matrix = np.identity(4)
+    matrix[:3, 3] = offset
+    return matrix
+
+
+def is_identity(matrix):
+    return np.allclose(matrix, np.identity(4), rtol=0.0, atol=1.0e-12)
+
+
+def to_zinc_matrix(matrix):
+    """
+    Scene.setTransformationMatrix takes 16 values in row-major order: the first four are the first row, so
+    the translation is at indexes 3, 7 and 11. The matrices here also transform column vectors, as
+    matrix.dot([x, y, z, 1]), so they are flattened without transposing.
+
+    :return: The 16 values of matrix in the row-major order taken by Scene.setTransformationMatrix.
+    """
+    return np.asarray(matrix, dtype=np.float64).ravel().tolist()
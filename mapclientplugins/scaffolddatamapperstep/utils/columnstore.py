@@ -0,0 +1,177 @@
+"""
+On-disk columnar storage: one raw typed array file per column plus a JSON index, memory-mapped column by
+column on first use.
+"""
+import json
+import os
+import shutil
+import uuid
+
+import numpy as np
+
+# Values converted at a time when promoting an integer column to float.
+PROMOTE_CHUNK_SIZE = 1024 ** 2
+
+_INDEX_FILE = 'columns.json'
+_INT32_INFO = np.iinfo(np.int32)
+
+
+def _column_file_name(index):
+    return 'column{0}.bin'.format(index)
+
+
+class ColumnStoreWriter(object):
+    """
+    Appends chunks of rows to a column store. Column types are inferred from the first chunk: integer
+    columns within the int32 range are stored as int32 and promoted to float32 if a later chunk needs it,
+    others as float32 unless listed in float64_columns. Values which are not numbers, such as labels, are
+    stored as NaN. The store is written to a temporary directory which replaces directory on close, so an
+    interrupted or failed conversion never leaves a partial store.
+    """
+
+    def __init__(self, directory, column_names, float64_columns=(), metadata=None):
+        self._directory = directory
+        self._temporary_directory = '{0}.tmp{1}'.format(directory, uuid.uuid4().hex)
+        self._column_names = list(column_names)
+        self._float64_columns = set(float64_columns)
+        self._metadata = metadata or {}
+        self._dtypes = None
+        self._count = 0
+        os.makedirs(self._temporary_directory)
+        self._streams = [open(self._get_column_path(c), 'wb') for c in range(len(self._column_names))]
+
+    def _get_column_path(self, c):
+        return os.path.join(self._temporary_directory, _column_file_name(c))
+
+    def append(self, columns):
+        """
+        :param columns: List of per-column sequences of values, empty strings or None marking missing values.
+        """
+        if self._dtypes is None:
+            self._dtypes = [np.float64 if name in self._float64_columns else
+                            (np.int32 if _are_integers(values) else np.float32)
+                            for name, values in zip(self._column_names, columns)]
+        for c, values in enumerate(columns):
+            if self._dtypes[c] == np.int32 and not _are_integers(values):
+                self._promote_column(c)
+            _to_array(values, self._dtypes[c]).tofile(self._streams[c])
+        self._count += len(columns[0]) if columns else 0
+
+    def _promote_column(self, c):
+        """
+        Rewrite an int32 column as float32 a chunk at a time.
+        """
+        self._streams[c].close()
+        path = self._get_column_path(c)
+        promoted_path = path + '.float32'
+        values = np.memmap(path, dtype=np.int32, mode='r') if os.path.getsize(path) else np.zeros(0, np.int32)
+        with open(promoted_path, 'wb') as stream:
+            for start in range(0, len(values), PROMOTE_CHUNK_SIZE):
+                values[start:start + PROMOTE_CHUNK_SIZE].astype(np.float32).tofile(stream)
+        del values
+        os.remove(path)
+        os.rename(promoted_path, path)
+        self._streams[c] = open(path, 'ab')
+        self._dtypes[c] = np.float32
+
+    def close(self):
+        """
+        Write the index and move the complete store into place, replacing any existing store.
+        """
+        for stream in self._streams:
+            stream.close()
+        dtypes = self._dtypes or [np.float32] * len(self._column_names)
+        index = {
+            'count': self._count,
+            'columns': [{'name': name, 'dtype': np.dtype(dtype).name}
+                        for name, dtype in zip(self._column_names, dtypes)],
+            'metadata': self._metadata,
+        }
+        with open(os.path.join(self._temporary_directory, _INDEX_FILE), 'w') as stream:
+            json.dump(index, stream)
+        if os.path.isdir(self._directory):
+            shutil.rmtree(self._directory)
+        os.rename(self._temporary_directory, self._directory)
+
+    def discard(self):
+        """
+        Remove the partly written store after a failed conversion.
+        """
+        for stream in self._streams:
+            stream.close()
+        shutil.rmtree(self._temporary_directory, ignore_errors=True)
+
+
+class ColumnStore(object):
+    """
+    Read access to a column store. Columns are only memory-mapped when first requested.
+    """
+
+    def __init__(self, directory):
+        self._directory = directory
+        with open(os.path.join(directory, _INDEX_FILE), 'r') as stream:
+            index = json.load(stream)
+        self._count = index['count']
+        self._metadata = index.get('metadata', {})
+        self._columns = index['columns']
+        self._column_indexes = dict((column['name'], c) for c, column in enumerate(self._columns))
+        self._loaded_columns = {}
+
+    @staticmethod
+    def exists(directory):
+        return os.path.isfile(os.path.join(directory, _INDEX_FILE))
+
+    def get_metadata(self):
+        return self._metadata
+
+    def get_column_names(self):
+        return [column['name'] for column in self._columns]
+
+    def get_row_count(self):
+        return self._count
+
+    def get_column(self, name):
+        """
+        :return: Read-only memory-mapped array of the column values.
+        """
+        column = self._loaded_columns.get(name)
+        if column is None:
+            c = self._column_indexes[name]
+            dtype = np.dtype(self._columns[c]['dtype'])
+            if self._count == 0:
+                column = np.zeros(0, dtype=dtype)
+            else:
+                column = np.memmap(os.path.join(self._directory, _column_file_name(c)), dtype=dtype, mode='r',
+                                   shape=(self._count,))
+            self._loaded_columns[name] = column
+        return column
+
+
+def _are_integers(values):
+    for value in values:
+        if isinstance(value, bool):
+            continue
+        if isinstance(value, float) or (value is None) or (value == ''):
+            return False
+        try:
+            value = int(value)
+        except (TypeError, ValueError):
+            return False
+        if not (_INT32_INFO.min <= value <= _INT32_INFO.max):
+            return False
+    return True
+
+
+def _to_float(value):
+    if (value is None) or (value == ''):
+        return np.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _to_array(values, dtype):
+    if dtype == np.int32:
+        return np.array([int(value) for value in values], dtype=dtype)
+    return np.array([_to_float(value) for value in values], dtype=dtype)
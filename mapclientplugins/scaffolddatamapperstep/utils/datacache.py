@@ -0,0 +1,198 @@
+"""
+Persistent binary cache of parsed data clouds.
+
+Each entry is a directory holding raw identifier and coordinate arrays, which are memory-mapped on load,
+and a JSON metadata file. Entries are keyed by source path and validated against its size, modification time
+and a content hash. The least recently used entries are evicted when the cache exceeds its size limit.
+"""
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+import uuid
+
+import numpy as np
+
+DEFAULT_SIZE_LIMIT = 2 * 1024 ** 3
+# Bytes hashed from each end of the source file: enough to detect rewrites without reading huge files.
+HASH_SAMPLE_SIZE = 1024 ** 2
+CACHE_VERSION = 2
+
+_METADATA_FILE = 'metadata.json'
+_IDENTIFIERS_FILE = 'identifiers.bin'
+_COORDINATES_FILE = 'coordinates.bin'
+_IDENTIFIER_DTYPE = np.int32
+_COORDINATE_DTYPE = np.float64
+
+
+def get_user_cache_directory(name='scaffolddatamapper'):
+    """
+    :return: Per-user cache directory for name, outside any workflow so it is never shared or versioned with it.
+    """
+    if sys.platform.startswith('win'):
+        base = os.environ.get('LOCALAPPDATA', os.path.expanduser('~'))
+    elif sys.platform == 'darwin':
+        base = os.path.join(os.path.expanduser('~'), 'Library', 'Caches')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache'))
+    return os.path.join(base, name)
+
+
+class DataCache(object):
+
+    def __init__(self, cache_directory, size_limit=DEFAULT_SIZE_LIMIT):
+        self._cache_directory = cache_directory
+        self._size_limit = size_limit
+
+    def _get_entry_directory(self, file_path):
+        key = hashlib.sha1(os.path.abspath(file_path).encode('utf-8')).hexdigest()
+        return os.path.join(self._cache_directory, key)
+
+    @staticmethod
+    def get_fingerprint(file_path):
+        """
+        :return: Dict of size, modification time and sampled content hash of file_path.
+        """
+        size = os.path.getsize(file_path)
+        content_hash = hashlib.sha1()
+        with open(file_path, 'rb') as stream:
+            content_hash.update(stream.read(HASH_SAMPLE_SIZE))
+            if size > 2 * HASH_SAMPLE_SIZE:
+                stream.seek(-HASH_SAMPLE_SIZE, os.SEEK_END)
+            content_hash.update(stream.read(HASH_SAMPLE_SIZE))
+        return {'size': size, 'mtime': os.path.getmtime(file_path), 'hash': content_hash.hexdigest()}
+
+    def load(self, file_path):
+        """
+        :return: metadata dict, memory-mapped identifiers and coordinates arrays, or None if there is no valid
+        entry for the current content of file_path.
+        """
+        entry_directory = self._get_entry_directory(file_path)
+        metadata_path = os.path.join(entry_directory, _METADATA_FILE)
+        try:
+            with open(metadata_path, 'r') as stream:
+                metadata = json.load(stream)
+        except (IOError, OSError, ValueError):
+            return None
+        if (metadata.get('version') != CACHE_VERSION) or \
+                (metadata.get('fingerprint') != self.get_fingerprint(file_path)):
+            return None
+        count = metadata['count']
+        if count == 0:
+            return None
+        identifiers = np.memmap(os.path.join(entry_directory, _IDENTIFIERS_FILE), dtype=_IDENTIFIER_DTYPE,
+                                mode='r', shape=(count,))
+        coordinates = np.memmap(os.path.join(entry_directory, _COORDINATES_FILE), dtype=_COORDINATE_DTYPE,
+                                mode='r', shape=(count, len(metadata['component_names'])))
+        # The metadata modification time records the last use for LRU eviction.
+        os.utime(metadata_path, None)
+        return metadata, identifiers, coordinates
+
+    def create_writer(self, file_path):
+        return DataCacheWriter(self, file_path, self._get_entry_directory(file_path))
+
+    def evict(self, keep=None):
+        """
+        Remove least recently used entries until the cache fits its size limit.
+
+        :param keep: Optional entry directory never to evict.
+        """
+        if not os.path.isdir(self._cache_directory):
+            return
+        entries = []
+        total_size = 0
+        for name in os.listdir(self._cache_directory):
+            if '.' in name:
+                # Temporary or outdated entry owned by a commit in progress.
+                continue
+            entry_directory = os.path.join(self._cache_directory, name)
+            metadata_path = os.path.join(entry_directory, _METADATA_FILE)
+            if not os.path.isfile(metadata_path):
+                continue
+            size = sum(os.path.getsize(os.path.join(entry_directory, f)) for f in os.listdir(entry_directory))
+            entries.append((os.path.getmtime(metadata_path), size, entry_directory))
+            total_size += size
+        for _, size, entry_directory in sorted(entries):
+            if total_size <= self._size_limit:
+                break
+            if entry_directory != keep:
+                shutil.rmtree(entry_directory, ignore_errors=True)
+                total_size -= size
+
+
+class DataCacheWriter(object):
+    """
+    Appends batches of parsed datapoints to a temporary entry which replaces any existing one on commit.
+    """
+
+    def __init__(self, cache, file_path, entry_directory):
+        self._cache = cache
+        self._fingerprint = cache.get_fingerprint(file_path)
+        self._entry_directory = entry_directory
+        self._temporary_directory = '{0}.tmp{1}'.format(entry_directory, uuid.uuid4().hex)
+        if os.path.isdir(self._temporary_directory):
+            shutil.rmtree(self._temporary_directory)
+        os.makedirs(self._temporary_directory)
+        self._identifiers_stream = open(os.path.join(self._temporary_directory, _IDENTIFIERS_FILE), 'wb')
+        self._coordinates_stream = open(os.path.join(self._temporary_directory, _COORDINATES_FILE), 'wb')
+        self._count = 0
+
+    def append(self, identifiers, coordinates):
+        np.ascontiguousarray(identifiers, dtype=_IDENTIFIER_DTYPE).tofile(self._identifiers_stream)
+        np.ascontiguousarray(coordinates, dtype=_COORDINATE_DTYPE).tofile(self._coordinates_stream)
+        self._count += len(identifiers)
+
+    def commit(self, field_name, component_names, group_name, groups=None):
+        """
+        :param groups: Optional dict mapping group names to inclusive [first, last] identifier ranges.
+        """
+        self._identifiers_stream.close()
+        self._coordinates_stream.close()
+        metadata = {
+            'version': CACHE_VERSION,
+            'fingerprint': self._fingerprint,
+            'count': self._count,
+            'field_name': field_name,
+            'component_names': component_names,
+            'group_name': group_name,
+            'groups': groups if groups is not None else {},
+            'created': time.time(),
+        }
+        with open(os.path.join(self._temporary_directory, _METADATA_FILE), 'w') as stream:
+            json.dump(metadata, stream)
+        self._move_into_place()
+        self._cache.evict(keep=self._entry_directory)
+
+    def _move_into_place(self):
+        """
+        Rename the temporary entry into place. An outdated entry is first renamed aside, so readers only ever
+        see a complete entry. If another process commits the entry first, its entry is kept; caching is best
+        effort, so losing the race is not an error.
+        """
+        if os.path.isdir(self._entry_directory) and not self._is_current_entry():
+            outdated_directory = '{0}.old{1}'.format(self._entry_directory, uuid.uuid4().hex)
+            try:
+                os.rename(self._entry_directory, outdated_directory)
+            except OSError:
+                pass
+            else:
+                shutil.rmtree(outdated_directory, ignore_errors=True)
+        try:
+            os.rename(self._temporary_directory, self._entry_directory)
+        except OSError:
+            shutil.rmtree(self._temporary_directory, ignore_errors=True)
+
+    def _is_current_entry(self):
+        try:
+            with open(os.path.join(self._entry_directory, _METADATA_FILE), 'r') as stream:
+                metadata = json.load(stream)
+        except (IOError, OSError, ValueError):
+            return False
+        return (metadata.get('version') == CACHE_VERSION) and (metadata.get('fingerprint') == self._fingerprint)
+
+    def discard(self):
+        self._identifiers_stream.close()
+        self._coordinates_stream.close()
+        shutil.rmtree(self._temporary_directory, ignore_errors=True)
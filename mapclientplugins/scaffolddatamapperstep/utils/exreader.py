@@ -0,0 +1,209 @@
+"""
+Streaming parser for EX data point clouds.
+
+Only the common point cloud layout is handled: one rectangular cartesian coordinate field storing node values
+without derivatives or versions, optionally in one group, followed by any number of node groups as written by
+Zinc after the nodes. Anything else raises ExFormatError so the caller can fall back to the complete Zinc
+reader. The parser has no Zinc dependency; see exwriter for creating the parsed datapoints.
+"""
+import os
+import re
+
+import numpy as np
+
+DEFAULT_CHUNK_SIZE = 65536
+
+_FIELD_PATTERN = re.compile(r'^\s*1\)\s*(.+?),\s*coordinate,\s*rectangular cartesian,.*#Components=(\d+)', re.I)
+_COMPONENT_PATTERN = re.compile(r'^\s*(\S+)\.\s+(.*)$')
+_RANGES_PATTERN = re.compile(r'^\d+(\.\.\d+)?(\s*,\s*\d+(\.\.\d+)?)*$')
+_IGNORED_PREFIXES = ('EX Version:', 'Region:', '!', 'Define node template:', 'Node template:', 'Shape.')
+
+
+class ExFormatError(ValueError):
+    pass
+
+
+class ExStreamReader(object):
+    """
+    Parses an EX data file line by line into fixed size array buffers, so memory use is bounded by the chunk
+    size rather than the file size.
+    """
+
+    def __init__(self, file_path, chunk_size=DEFAULT_CHUNK_SIZE, progress_callback=None):
+        """
+        :param chunk_size: Number of datapoints in each parsed batch.
+        :param progress_callback: Optional callable(bytes_read, total_bytes) called after every batch.
+        """
+        self._file_path = file_path
+        self._chunk_size = chunk_size
+        self._progress_callback = progress_callback
+        self._field_name = None
+        self._number_of_components = 0
+        self._component_names = []
+        self._group_name = None
+        self._groups = {}
+
+    def iterate_batches(self):
+        """
+        Parse the file, yielding the datapoints in batches of at most chunk_size. The arrays yielded are reused
+        for the next batch, so consumers must copy anything they keep.
+
+        :return: Generator of (identifiers, coordinates) arrays.
+        """
+        total_bytes = os.path.getsize(self._file_path)
+        bytes_read = 0
+        identifiers = np.empty(self._chunk_size, dtype=np.int32)
+        coordinates = None
+        count = 0
+        node_identifier = None
+        values = []
+        header = []
+        # Name of the group whose node ranges are being read, in the group blocks Zinc writes after the nodes.
+        ranges_group_name = None
+        # Binary mode so progress counts bytes, matching the file size.
+        with open(self._file_path, 'rb') as stream:
+            for raw_line in stream:
+                bytes_read += len(raw_line)
+                line = raw_line.decode('utf-8').strip()
+                if not line:
+                    continue
+                if (ranges_group_name is not None) and _RANGES_PATTERN.match(line):
+                    self._groups[ranges_group_name].extend(_parse_ranges(line))
+                    continue
+                ranges_group_name = None
+                if line.startswith('Node:'):
+                    if header:
+                        self._parse_header(header)
+                        header = []
+                    if self._field_name is None:
+                        raise ExFormatError('Node before any field definition')
+                    if coordinates is None:
+                        coordinates = np.empty((self._chunk_size, self._number_of_components), dtype=np.float64)
+                    node_identifier = _parse_int(line.split(':', 1)[1])
+                    values = []
+                elif (node_identifier is not None) and _is_number(line.split(None, 1)[0]):
+                    values.extend(line.split())
+                elif line.startswith('Node group:'):
+                    node_identifier = None
+                    ranges_group_name = self._get_group_block_name(header)
+                    header = []
+                    continue
+                else:
+                    node_identifier = None
+                    if not line.startswith(_IGNORED_PREFIXES):
+                        header.append(line)
+                    continue
+                if len(values) == self._number_of_components:
+                    identifiers[count] = node_identifier
+                    coordinates[count] = [_parse_float(value) for value in values]
+                    count += 1
+                    node_identifier = None
+                    if count == self._chunk_size:
+                        self._report_progress(bytes_read, total_bytes)
+                        yield identifiers[:count], coordinates[:count]
+                        count = 0
+                elif len(values) > self._number_of_components:
+                    raise ExFormatError('Node has more values than the coordinate field components')
+        if header:
+            raise ExFormatError('Unsupported content after the last node')
+        if coordinates is None:
+            raise ExFormatError('No datapoints found')
+        if node_identifier is not None:
+            raise ExFormatError('Last node has too few values')
+        self._report_progress(total_bytes, total_bytes)
+        if count:
+            yield identifiers[:count], coordinates[:count]
+
+    def get_field_definition(self):
+        """
+        :return: Coordinate field name, component names and group name read from the file header.
+        """
+        return self._field_name, self._component_names, self._group_name
+
+    def get_groups(self):
+        """
+        :return: Dict mapping the name of every group listed after the nodes to a list of inclusive
+        [first, last] identifier ranges of its datapoints.
+        """
+        return self._groups
+
+    def _report_progress(self, bytes_read, total_bytes):
+        if self._progress_callback is not None:
+            self._progress_callback(bytes_read, total_bytes)
+
+    def _get_group_block_name(self, lines):
+        if (len(lines) != 1) or not lines[0].startswith('Group name:'):
+            raise ExFormatError('Node group without a group name')
+        name = lines[0].split(':', 1)[1].strip()
+        self._groups.setdefault(name, [])
+        return name
+
+    def _parse_header(self, lines):
+        group_name = self._group_name
+        field_name = None
+        number_of_components = 0
+        component_names = []
+        for line in lines:
+            compact = line.replace(' ', '')
+            if line.startswith('Group name:'):
+                group_name = line.split(':', 1)[1].strip()
+            elif compact.startswith('#Fields='):
+                if compact != '#Fields=1':
+                    raise ExFormatError('Only a single coordinate field is supported')
+            elif _FIELD_PATTERN.match(line):
+                match = _FIELD_PATTERN.match(line)
+                field_name = match.group(1).strip()
+                number_of_components = int(match.group(2))
+            elif _COMPONENT_PATTERN.match(line) and (field_name is not None):
+                name, definition = _COMPONENT_PATTERN.match(line).groups()
+                definition = definition.replace(' ', '')
+                if ('#Versions' in definition) or \
+                        not (('#Derivatives=0' in definition) or ('#Values=1' in definition)):
+                    raise ExFormatError('Only node values without derivatives or versions are supported')
+                component_names.append(name)
+            else:
+                raise ExFormatError('Unsupported EX header line: ' + line)
+        if (field_name is None) or (len(component_names) != number_of_components):
+            raise ExFormatError('Could not determine the coordinate field definition')
+        if self._field_name is not None:
+            if (field_name, component_names, group_name) != \
+                    (self._field_name, self._component_names, self._group_name):
+                raise ExFormatError('Only a single field definition and group are supported')
+        self._field_name = field_name
+        self._number_of_components = number_of_components
+        self._component_names = component_names
+        self._group_name = group_name
+
+
+def _parse_ranges(text):
+    """
+    :param text: Comma separated identifiers and first..last ranges, e.g. '1..5,7'.
+    :return: List of inclusive [first, last] ranges.
+    """
+    ranges = []
+    for item in text.split(','):
+        bounds = item.strip().split('..')
+        ranges.append([int(bounds[0]), int(bounds[-1])])
+    return ranges
+
+
+def _parse_int(token):
+    try:
+        return int(token)
+    except ValueError:
+        raise ExFormatError('Invalid node identifier: ' + token.strip())
+
+
+def _parse_float(token):
+    try:
+        return float(token)
+    except ValueError:
+        raise ExFormatError('Invalid node value: ' + token)
+
+
+def _is_number(token):
+    try:
+        float(token)
+    except ValueError:
+        return False
+    return True
@@ -0,0 +1,103 @@
+"""
+Creation of datapoints in Zinc from arrays parsed by exreader or loaded from the data cache.
+
+Zinc has no call creating many nodes at once, so each batch is formatted as a small EX document in memory and
+read with the region's EX reader, instead of creating and assigning every datapoint through the Python API.
+"""
+import numpy as np
+
+from opencmiss.zinc.field import Field
+from opencmiss.zinc.status import OK as ZINC_OK
+
+from .exreader import DEFAULT_CHUNK_SIZE, ExFormatError
+
+
+def write_datapoints(region, field_name, component_names, group_name, identifiers, coordinates, groups=None,
+                     chunk_size=DEFAULT_CHUNK_SIZE, progress_callback=None):
+    """
+    Create datapoints from already parsed arrays, for example memory-mapped from a cache, in batches.
+
+    :param groups: Optional dict mapping group names to inclusive [first, last] identifier ranges.
+    :param progress_callback: Optional callable(points_written, total_points) called after every batch.
+    :return: The coordinate field the datapoints were written to.
+    """
+    writer = DatapointWriter(region, field_name, component_names, group_name)
+    count = len(identifiers)
+    for start in range(0, count, chunk_size):
+        end = min(start + chunk_size, count)
+        writer.write(np.asarray(identifiers[start:end]), np.asarray(coordinates[start:end]))
+        if progress_callback is not None:
+            progress_callback(end, count)
+    if groups:
+        writer.write_groups(groups)
+    return writer.get_field()
+
+
+class DatapointWriter(object):
+    """
+    Creates or updates datapoints storing a rectangular cartesian coordinate field, optionally adding them to
+    a group.
+    """
+
+    def __init__(self, region, field_name, component_names, group_name):
+        self._region = region
+        self._fm = region.getFieldmodule()
+        self._field_name = field_name
+        self._group_name = group_name
+        field = self._fm.findFieldByName(field_name)
+        if field.isValid() and (field.getNumberOfComponents() != len(component_names)):
+            raise ExFormatError('Existing field ' + field_name + ' is incompatible')
+        # Fields and groups the EX reader will create, unmanaged again by discard().
+        self._created_names = [name for name in [field_name, group_name]
+                               if name and not self._fm.findFieldByName(name).isValid()]
+        header = [' Region: /']
+        if group_name:
+            header.append(' Group name: ' + group_name)
+        header.append(' #Fields=1')
+        header.append(' 1) {0}, coordinate, rectangular cartesian, #Components={1}'.format(
+            field_name, len(component_names)))
+        for c, component_name in enumerate(component_names):
+            header.append('   {0}.  Value index={1}, #Derivatives=0'.format(component_name, c + 1))
+        self._header = '\n'.join(header) + '\n'
+        self._node_format = ' Node: {0}\n ' + ' '.join(['{%d!r}' % (c + 1) for c in range(len(component_names))])
+
+    def get_field(self):
+        return self._fm.findFieldByName(self._field_name)
+
+    def _read(self, text):
+        sir = self._region.createStreaminformationRegion()
+        resource = sir.createStreamresourceMemoryBuffer(text.encode('utf-8'))
+        sir.setResourceDomainTypes(resource, Field.DOMAIN_TYPE_DATAPOINTS)
+        if self._region.read(sir) != ZINC_OK:
+            raise ExFormatError('Zinc could not read the datapoints into field ' + self._field_name)
+
+    def write(self, identifiers, coordinates):
+        node_format = self._node_format
+        nodes = [node_format.format(identifier, *values)
+                 for identifier, values in zip(identifiers.tolist(), coordinates.tolist())]
+        self._read(self._header + '\n'.join(nodes) + '\n')
+
+    def write_groups(self, groups):
+        """
+        :param groups: Dict mapping group names to inclusive [first, last] identifier ranges of datapoints.
+        """
+        for group_name, ranges in groups.items():
+            if not self._fm.findFieldByName(group_name).isValid():
+                self._created_names.append(group_name)
+            lines = [' Region: /', ' Group name: ' + group_name, ' #Fields=0']
+            for first, last in ranges:
+                lines.extend(' Node: {0}'.format(identifier) for identifier in range(first, last + 1))
+            self._read('\n'.join(lines) + '\n')
+
+    def discard(self):
+        """
+        Destroy all datapoints and unmanage the fields and groups this writer created, after a failed read.
+        """
+        self._fm.beginChange()
+        self._fm.findNodesetByFieldDomainType(Field.DOMAIN_TYPE_DATAPOINTS).destroyAllNodes()
+        for name in self._created_names:
+            field = self._fm.findFieldByName(name)
+            if field.isValid():
+                field.setManaged(False)
+        self._fm.endChange()
+        self._created_names = []
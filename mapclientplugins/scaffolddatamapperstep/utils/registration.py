@@ -0,0 +1,130 @@
+"""
+Vectorised rigid point cloud registration.
+"""
+import time
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+# Voxel size of the coarsest pyramid level relative to the fixed cloud bounding box diagonal when no
+# voxel size is given.
+DEFAULT_VOXEL_FRACTION = 1.0 / 64.0
+
+
+def fit_rigid_transformation(source, target):
+    """
+    Least squares rigid transformation mapping source points onto corresponding target points (Kabsch).
+
+    :param source: (N, 3) array of points.
+    :param target: (N, 3) array of corresponding points.
+    :return: 4x4 affine matrix.
+    """
+    source_centre = source.mean(axis=0)
+    target_centre = target.mean(axis=0)
+    covariance = (source - source_centre).T.dot(target - target_centre)
+    u, _, vt = np.linalg.svd(covariance)
+    reflection = np.sign(np.linalg.det(vt.T.dot(u.T)))
+    rotation = vt.T.dot(np.diag([1.0, 1.0, reflection])).dot(u.T)
+    matrix = np.identity(4)
+    matrix[:3, :3] = rotation
+    matrix[:3, 3] = target_centre - rotation.dot(source_centre)
+    return matrix
+
+
+def transform_points(matrix, points):
+    return points.dot(matrix[:3, :3].T) + matrix[:3, 3]
+
+
+def icp(moving, fixed, initial=None, max_iterations=50, tolerance=1.0e-6, callback=None, deadline=None):
+    """
+    Iterative closest point rigid registration of the moving points to the fixed points. Every fixed point
+    is paired with its nearest transformed moving point, so the moving cloud may extend beyond the fixed one.
+
+    :param moving: (M, 3) array of points to align.
+    :param fixed: (N, 3) array of target points.
+    :param initial: Optional 4x4 starting transformation for the moving points.
+    :param max_iterations: Maximum number of iterations.
+    :param tolerance: Stop when the RMS residual improves by less than this.
+    :param callback: Optional callable(iteration, residual) called after every iteration.
+    :param deadline: Optional time.time() value after which no further iterations are started.
+    :return: 4x4 transformation of the moving points, list of RMS residuals per iteration.
+    """
+    transformation = np.identity(4) if initial is None else np.array(initial, dtype=np.float64)
+    residuals = []
+    for iteration in range(max_iterations):
+        transformed = transform_points(transformation, moving)
+        distances, nearest = cKDTree(transformed).query(fixed)
+        residual = float(np.sqrt(np.mean(distances ** 2)))
+        residuals.append(residual)
+        if callback is not None:
+            callback(iteration, residual)
+        if (len(residuals) > 1) and (residuals[-2] - residual < tolerance):
+            break
+        if (deadline is not None) and (time.time() > deadline):
+            break
+        transformation = fit_rigid_transformation(transformed[nearest], fixed).dot(transformation)
+    return transformation, residuals
+
+
+def voxel_downsample(points, voxel_size):
+    """
+    Replace all points falling in the same cubic voxel by their centroid.
+
+    :param points: (N, 3) array of points.
+    :param voxel_size: Voxel edge length.
+    :return: (M, 3) array of voxel centroids, M <= N.
+    """
+    minimums = points.min(axis=0)
+    keys = np.floor((points - minimums) / voxel_size).astype(np.int64)
+    dimensions = [int(dimension) for dimension in keys.max(axis=0) + 1]
+    if dimensions[0] * dimensions[1] * dimensions[2] <= np.iinfo(np.int64).max:
+        linear_keys = (keys[:, 0] * dimensions[1] + keys[:, 1]) * dimensions[2] + keys[:, 2]
+        _, inverse, counts = np.unique(linear_keys, return_inverse=True, return_counts=True)
+    else:
+        # A single integer key would overflow for this many voxels, so compare the voxel indexes as rows.
+        _, inverse, counts = np.unique(keys, axis=0, return_inverse=True, return_counts=True)
+        inverse = inverse.reshape(-1)
+    centroids = np.empty((len(counts), 3), dtype=np.float64)
+    for c in range(3):
+        centroids[:, c] = np.bincount(inverse, weights=points[:, c]) / counts
+    return centroids
+
+
+def multiresolution_icp(moving, fixed, voxel_size=None, levels=3, time_budget=None, max_iterations=30,
+                        tolerance=1.0e-6, callback=None):
+    """
+    Coarse-to-fine ICP over a voxel-grid pyramid of both clouds. Each level starts from the transformation
+    converged at the coarser level, so most iterations run on few points.
+
+    :param voxel_size: Voxel size of the finest level, doubled for each coarser level. If None the finest
+    level uses the full resolution clouds and the coarsest voxel size is DEFAULT_VOXEL_FRACTION of the fixed
+    cloud extent.
+    :param levels: Number of pyramid levels.
+    :param time_budget: Optional seconds after which no further iterations are started.
+    :param callback: Optional callable(level, iteration, residual), level 0 being the coarsest.
+    :return: 4x4 transformation of the moving points, list of residual lists per level.
+    """
+    deadline = None if time_budget is None else time.time() + time_budget
+    if voxel_size is None:
+        extent = np.linalg.norm(fixed.max(axis=0) - fixed.min(axis=0))
+        coarsest_voxel_size = extent * DEFAULT_VOXEL_FRACTION
+        voxel_sizes = [coarsest_voxel_size / (2 ** level) for level in range(levels - 1)] + [None]
+    else:
+        voxel_sizes = [voxel_size * (2 ** (levels - 1 - level)) for level in range(levels)]
+    transformation = np.identity(4)
+    residuals = []
+    for level, level_voxel_size in enumerate(voxel_sizes):
+        if level_voxel_size:
+            level_moving = voxel_downsample(moving, level_voxel_size)
+            level_fixed = voxel_downsample(fixed, level_voxel_size)
+        else:
+            level_moving, level_fixed = moving, fixed
+        level_callback = None if callback is None else \
+            (lambda iteration, residual, level=level: callback(level, iteration, residual))
+        transformation, level_residuals = icp(level_moving, level_fixed, initial=transformation,
+                                              max_iterations=max_iterations, tolerance=tolerance,
+                                              callback=level_callback, deadline=deadline)
+        residuals.append(level_residuals)
+        if (deadline is not None) and (time.time() > deadline):
+            break
+    return transformation, residuals
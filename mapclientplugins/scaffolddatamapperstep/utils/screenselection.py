@@ -0,0 +1,99 @@
+"""
+Screen-space selection of large point sets: points are projected with the scene viewer transformation and
+binned into a uniform pixel grid, so box and lasso queries only test points in the cells they overlap.
+"""
+import numpy as np
+
+DEFAULT_CELL_SIZE = 32.0
+
+
+def project_points(matrix, points):
+    """
+    Project points to mouse coordinates: pixels from the top left of the window with y increasing downward,
+    as in Qt mouse events. Zinc window pixel coordinates have y increasing upward from the top left, so
+    visible points have negative y there; this is the same negation the drag sessions apply in unproject.
+
+    :param matrix: 16 row-major values transforming world to Zinc window pixel top left coordinates.
+    :param points: (N, 3) array of world coordinates.
+    :return: (N, 2) mouse coordinates and (N,) mask of points in front of the viewer.
+    """
+    matrix = np.asarray(matrix, dtype=np.float64).reshape(4, 4)
+    homogeneous = points.dot(matrix[:, :3].T) + matrix[:, 3]
+    w = homogeneous[:, 3]
+    in_front = w > 0.0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        window = homogeneous[:, :2] / w[:, np.newaxis]
+    window[:, 1] = -window[:, 1]
+    return window, in_front
+
+
+class ScreenGridIndex(object):
+
+    def __init__(self, window_points, valid=None, cell_size=DEFAULT_CELL_SIZE):
+        """
+        :param window_points: (N, 2) projected mouse coordinates.
+        :param valid: Optional (N,) mask of points that may be selected.
+        """
+        self._points = window_points
+        self._cell_size = cell_size
+        indexes = np.arange(len(window_points)) if valid is None else np.flatnonzero(valid)
+        indexes = indexes[np.all(np.isfinite(window_points[indexes]), axis=1)]
+        cells = np.floor(window_points[indexes] / cell_size).astype(np.int64)
+        if len(indexes):
+            self._minimum_cell = cells.min(axis=0)
+            self._number_of_cells = cells.max(axis=0) - self._minimum_cell + 1
+        else:
+            self._minimum_cell = np.zeros(2, dtype=np.int64)
+            self._number_of_cells = np.ones(2, dtype=np.int64)
+        cell_keys = self._get_cell_keys(cells)
+        order = np.argsort(cell_keys, kind='mergesort')
+        self._sorted_keys = cell_keys[order]
+        self._sorted_indexes = indexes[order]
+
+    def _get_cell_keys(self, cells):
+        cells = cells - self._minimum_cell
+        return cells[:, 0] * self._number_of_cells[1] + cells[:, 1]
+
+    def _get_candidates(self, minimums, maximums):
+        first = np.maximum(np.floor(np.asarray(minimums) / self._cell_size).astype(np.int64), self._minimum_cell)
+        last = np.minimum(np.floor(np.asarray(maximums) / self._cell_size).astype(np.int64),
+                          self._minimum_cell + self._number_of_cells - 1)
+        if np.any(last < first):
+            return np.zeros(0, dtype=np.int64)
+        candidates = []
+        for cell_x in range(first[0], last[0] + 1):
+            # Cells with the same x are contiguous in key order.
+            keys = self._get_cell_keys(np.array([[cell_x, first[1]], [cell_x, last[1]]]))
+            start, end = np.searchsorted(self._sorted_keys, [keys[0], keys[1] + 1])
+            candidates.append(self._sorted_indexes[start:end])
+        return np.concatenate(candidates)
+
+    def query_box(self, x1, y1, x2, y2):
+        """
+        :return: Indexes of the points inside the mouse coordinate rectangle with corners (x1, y1) and (x2, y2).
+        """
+        minimums = [min(x1, x2), min(y1, y2)]
+        maximums = [max(x1, x2), max(y1, y2)]
+        candidates = self._get_candidates(minimums, maximums)
+        points = self._points[candidates]
+        inside = np.all((points >= minimums) & (points <= maximums), axis=1)
+        return candidates[inside]
+
+    def query_lasso(self, polygon):
+        """
+        :param polygon: Sequence of (x, y) mouse coordinates of the lasso outline.
+        :return: Indexes of the points inside the polygon, by the even-odd rule.
+        """
+        polygon = np.asarray(polygon, dtype=np.float64)
+        if len(polygon) < 3:
+            return np.zeros(0, dtype=np.int64)
+        candidates = self._get_candidates(polygon.min(axis=0), polygon.max(axis=0))
+        x = self._points[candidates, 0]
+        y = self._points[candidates, 1]
+        inside = np.zeros(len(candidates), dtype=bool)
+        for (x1, y1), (x2, y2) in zip(polygon, np.roll(polygon, -1, axis=0)):
+            crosses = (y1 > y) != (y2 > y)
+            if y1 != y2:
+                crosses &= x < (x2 - x1) * (y - y1) / (y2 - y1) + x1
+            inside ^= crosses
+        return candidates[inside]
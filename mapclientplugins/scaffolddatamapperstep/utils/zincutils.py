@@ -1,8 +1,14 @@
+import numpy as np
+
 from opencmiss.zinc.node import Node
 from opencmiss.zinc.field import Field
 from opencmiss.zinc.status import OK as ZINC_OK
 from opencmiss.utils.maths.vectorops import add, dot
 
+NODE_VALUE_LABELS = [Node.VALUE_LABEL_VALUE, Node.VALUE_LABEL_D_DS1, Node.VALUE_LABEL_D_DS2,
+                     Node.VALUE_LABEL_D2_DS1DS2, Node.VALUE_LABEL_D_DS3, Node.VALUE_LABEL_D2_DS1DS3,
+                     Node.VALUE_LABEL_D2_DS2DS3, Node.VALUE_LABEL_D3_DS1DS2DS3]
+
 
 def matrixvectormult(m, v):
     return [dot(row_m, v) for row_m in m]
@@ -101,3 +107,114 @@ def offset_scaffold(field, offset):
     if not success:
         print('zincutils.offset_scaffold: failed to get/set some values')
     return success
+
+
+class NodeParameterLayout(object):
+    """
+    Index of the node parameters of a finite element field, built once: the nodes, the derivative labels and
+    versions each one stores, and their row offsets into a flat (N, components) parameter buffer.
+    """
+
+    def __init__(self, field):
+        self._field = field.castFiniteElement()
+        self._number_of_components = field.getNumberOfComponents()
+        self._nodes = []
+        self._node_offsets = [0]
+        derivatives = []
+        versions = []
+        fm = field.getFieldmodule()
+        nodes = fm.findNodesetByFieldDomainType(Field.DOMAIN_TYPE_NODES)
+        node_template = nodes.createNodetemplate()
+        node_iter = nodes.createNodeiterator()
+        node = node_iter.next()
+        while node.isValid():
+            node_template.defineFieldFromNode(self._field, node)
+            for derivative in NODE_VALUE_LABELS:
+                number_of_versions = node_template.getValueNumberOfVersions(self._field, -1, derivative)
+                for v in range(1, number_of_versions + 1):
+                    derivatives.append(derivative)
+                    versions.append(v)
+            if len(derivatives) > self._node_offsets[-1]:
+                self._nodes.append(node)
+                self._node_offsets.append(len(derivatives))
+            node = node_iter.next()
+        self._derivatives = np.array(derivatives, dtype=np.int32)
+        self._versions = np.array(versions, dtype=np.int32)
+        self._value_rows = self._derivatives == Node.VALUE_LABEL_VALUE
+
+    def get_field(self):
+        return self._field
+
+    def get_size(self):
+        """
+        :return: Number of rows in the parameter buffer.
+        """
+        return len(self._derivatives)
+
+    def get_value_rows(self):
+        """
+        :return: Boolean array marking the rows which hold node values rather than derivatives.
+        """
+        return self._value_rows
+
+    def _iterate_parameters(self):
+        derivatives = self._derivatives.tolist()
+        versions = self._versions.tolist()
+        for index, node in enumerate(self._nodes):
+            yield node, [(row, derivatives[row], versions[row])
+                         for row in range(self._node_offsets[index], self._node_offsets[index + 1])]
+
+    def gather(self):
+        """
+        :return: Contiguous (N, components) float array of all node parameters, or None if any could not be read.
+        """
+        parameters = np.empty((self.get_size(), self._number_of_components), dtype=np.float64)
+        fm = self._field.getFieldmodule()
+        cache = fm.createFieldcache()
+        for node, rows in self._iterate_parameters():
+            cache.setNode(node)
+            for row, derivative, version in rows:
+                result, values = self._field.getNodeParameters(cache, -1, derivative, version,
+                                                               self._number_of_components)
+                if result != ZINC_OK:
+                    print('zincutils.NodeParameterLayout.gather: failed to get some values')
+                    return None
+                parameters[row] = values
+        return parameters
+
+    def scatter(self, parameters):
+        """
+        Write a (N, components) parameter array back to the nodes inside one change block.
+
+        :return: True on success, otherwise False.
+        """
+        success = True
+        values_list = parameters.tolist()
+        fm = self._field.getFieldmodule()
+        fm.beginChange()
+        cache = fm.createFieldcache()
+        for node, rows in self._iterate_parameters():
+            cache.setNode(node)
+            for row, derivative, version in rows:
+                result = self._field.setNodeParameters(cache, -1, derivative, version, values_list[row])
+                if result != ZINC_OK:
+                    success = False
+        fm.endChange()
+        if not success:
+            print('zincutils.NodeParameterLayout.scatter: failed to set some values')
+        return success
+
+
+def transform_node_parameters(layout, parameters, matrix):
+    """
+    :param layout: NodeParameterLayout describing the rows of parameters.
+    :param parameters: (N, components) array of node parameters.
+    :param matrix: Square affine matrix of size components + 1.
+    :return: New parameter array with the linear part of matrix applied to all rows and the translation
+    added to node value rows only.
+    """
+    matrix = np.asarray(matrix, dtype=np.float64)
+    size = matrix.shape[0] - 1
+    transformed = parameters.dot(matrix[:size, :size].T)
+    transformed[layout.get_value_rows()] += matrix[:size, size]
+    return transformed
@@ -1,19 +1,30 @@
-from PySide import QtCore
+from PySide import QtCore, QtGui
 from opencmiss.zincwidgets.sceneviewerwidget import SceneviewerWidget, SelectionMode
 from opencmiss.zinc.field import Field
 from opencmiss.zinc.graphics import Graphics
-from opencmiss.zinc.scenecoordinatesystem import SCENECOORDINATESYSTEM_WINDOW_PIXEL_TOP_LEFT
+from opencmiss.zinc.scenecoordinatesystem import SCENECOORDINATESYSTEM_WINDOW_PIXEL_TOP_LEFT, \
+    SCENECOORDINATESYSTEM_WORLD
 from opencmiss.zinc.result import RESULT_OK as ZINC_RESULT_OK
 
+from .dragsession import DragEditSession, GroupDragSession
+
+DRAG_FLUSH_INTERVAL_MS = 16
+
 
 class DataMapperSceneviewerWidget(SceneviewerWidget):
 
     def __init__(self, parent=None, shareable_widget=None):
         super(DataMapperSceneviewerWidget, self).__init__(parent)
         self._model = None
-        self._editNode = None
-        self._editGraphics = None
-        self._lastMousePos = None
+        self._dragSession = None
+        # Drag edits are written back at most once per display frame.
+        self._dragFlushTimer = QtCore.QTimer(self)
+        self._dragFlushTimer.setSingleShot(True)
+        self._dragFlushTimer.setInterval(DRAG_FLUSH_INTERVAL_MS)
+        self._dragFlushTimer.timeout.connect(self._flushDragSession)
+        self._regionSelectionStart = None
+        self._lassoPoints = None
+        self._rubberBand = None
 
     def set_generator_model(self, model):
         self._model = model
@@ -36,12 +47,13 @@ class DataMapperSceneviewerWidget(SceneviewerWidget):
         scenefiltermodule.endChange()
         return node, graphics
 
-    def selectNode(self, node):
+    def selectNode(self, node, add=False):
         nodeset = node.getNodeset()
         fieldmodule = nodeset.getFieldmodule()
         fieldmodule.beginChange()
         selectionGroup = self.getOrCreateSelectionGroup()
-        selectionGroup.clear()
+        if not add:
+            selectionGroup.clear()
         nodegroup = selectionGroup.getFieldNodeGroup(nodeset)
         if not nodegroup.isValid():
             nodegroup = selectionGroup.createFieldNodeGroup(nodeset)
@@ -49,74 +61,94 @@ class DataMapperSceneviewerWidget(SceneviewerWidget):
         result = nodesetGroup.addNode(node)
         fieldmodule.endChange()
 
+    def isNodeSelected(self, node):
+        selectionGroup = self.getOrCreateSelectionGroup()
+        nodegroup = selectionGroup.getFieldNodeGroup(node.getNodeset())
+        return nodegroup.isValid() and nodegroup.getNodesetGroup().containsNode(node)
+
     def mousePressEvent(self, event):
         if (event.button() == QtCore.Qt.LeftButton) and self._selectionKeyPressed:
             node, graphics = self.getNearestNodeAndGraphics(event.x(), event.y())
             if node and (graphics.getType() == Graphics.TYPE_POINTS) and (graphics.getFieldDomainType() == Field.DOMAIN_TYPE_DATAPOINTS):
-                self.selectNode(node)
-                self._editNode = node
-                self._editGraphics = graphics
-                self._lastMousePos = [ event.x(), event.y() ]
+                mousePos = [event.x(), event.y()]
+                if self.isNodeSelected(node):
+                    # Dragging any point of the current selection moves the whole selected group.
+                    nodeSession = DragEditSession(self, node, graphics, mousePos)
+                    block = None
+                    if (self._model is not None) and (nodeSession.get_coordinates() is not None):
+                        block = self._model.create_selected_data_block(self.getOrCreateSelectionGroup())
+                    if (block is not None) and (block.get_size() > 1):
+                        self._dragSession = GroupDragSession(self, block, nodeSession.get_coordinates(), mousePos)
+                    else:
+                        self._dragSession = nodeSession
+                else:
+                    self.selectNode(node, add=bool(event.modifiers() & QtCore.Qt.ShiftModifier))
+                    self._dragSession = DragEditSession(self, node, graphics, mousePos)
                 return
-        self._editNode = None
-        self._lastMousePos = None
+        self._dragSession = None
+        if (event.button() == QtCore.Qt.LeftButton) and self._selectionKeyPressed and (self._model is not None):
+            self._startRegionSelection(event)
+            return
         super(DataMapperSceneviewerWidget, self).mousePressEvent(event)
 
+    def _startRegionSelection(self, event):
+        """
+        Start a rubber-band box selection, or a lasso selection if Ctrl is held, of datapoints.
+        """
+        self._regionSelectionStart = [event.x(), event.y()]
+        if event.modifiers() & QtCore.Qt.ControlModifier:
+            self._lassoPoints = [(event.x(), event.y())]
+        else:
+            if self._rubberBand is None:
+                self._rubberBand = QtGui.QRubberBand(QtGui.QRubberBand.Rectangle, self)
+            self._rubberBand.setGeometry(QtCore.QRect(event.pos(), QtCore.QSize()))
+            self._rubberBand.show()
+
+    def _updateRegionSelection(self, event):
+        if self._lassoPoints is not None:
+            self._lassoPoints.append((event.x(), event.y()))
+        else:
+            start = QtCore.QPoint(self._regionSelectionStart[0], self._regionSelectionStart[1])
+            self._rubberBand.setGeometry(QtCore.QRect(start, event.pos()).normalized())
+
+    def _finishRegionSelection(self, event):
+        add = bool(event.modifiers() & QtCore.Qt.ShiftModifier)
+        result, windowMatrix = self._sceneviewer.getTransformationMatrix(
+            SCENECOORDINATESYSTEM_WORLD, SCENECOORDINATESYSTEM_WINDOW_PIXEL_TOP_LEFT)
+        if result == ZINC_RESULT_OK:
+            selectionGroup = self.getOrCreateSelectionGroup()
+            if self._lassoPoints is not None:
+                self._model.select_data_in_window(windowMatrix, selectionGroup, lasso=self._lassoPoints, add=add)
+            else:
+                box = self._regionSelectionStart + [event.x(), event.y()]
+                self._model.select_data_in_window(windowMatrix, selectionGroup, box=box, add=add)
+        if self._rubberBand is not None:
+            self._rubberBand.hide()
+        self._regionSelectionStart = None
+        self._lassoPoints = None
+
     def mouseMoveEvent(self, event):
-        if self._editNode:
-            mousePos = [ event.x(), event.y() ]
-            nodeset = self._editNode.getNodeset()
-            fieldmodule = nodeset.getFieldmodule()
-            fieldmodule.beginChange()
-            meshEditsNodeset = self._model.getOrCreateMeshEditsNodesetGroup(nodeset)
-            meshEditsNodeset.addNode(self._editNode)
-            editCoordinateField = coordinateField = self._editGraphics.getCoordinateField()
-            if coordinateField.getCoordinateSystemType() != Field.COORDINATE_SYSTEM_TYPE_RECTANGULAR_CARTESIAN:
-                editCoordinateField = fieldmodule.createFieldCoordinateTransformation(coordinateField)
-                editCoordinateField.setCoordinateSystemType(Field.COORDINATE_SYSTEM_TYPE_RECTANGULAR_CARTESIAN)
-            fieldcache = fieldmodule.createFieldcache()
-            fieldcache.setNode(self._editNode)
-            componentsCount = coordinateField.getNumberOfComponents()
-            result, initialCoordinates = editCoordinateField.evaluateReal(fieldcache, 3)
-            if result == ZINC_RESULT_OK:
-                for c in range(componentsCount, 3):
-                    initialCoordinates.append(0.0)
-                pointattr = self._editGraphics.getGraphicspointattributes()
-                editVectorField = vectorField = pointattr.getOrientationScaleField()
-                pointBaseSize = pointattr.getBaseSize(3)[1][0]
-                pointScaleFactor = pointattr.getScaleFactors(3)[1][0]
-                if editVectorField.isValid() and (vectorField.getNumberOfComponents() == componentsCount) \
-                        and (pointBaseSize == 0.0) and (pointScaleFactor != 0.0):
-                    if vectorField.getCoordinateSystemType() != Field.COORDINATE_SYSTEM_TYPE_RECTANGULAR_CARTESIAN:
-                        editVectorField = fieldmodule.createFieldCoordinateTransformation(vectorField, coordinateField)
-                        editVectorField.setCoordinateSystemType(Field.COORDINATE_SYSTEM_TYPE_RECTANGULAR_CARTESIAN)
-                    result, initialVector = editVectorField.evaluateReal(fieldcache, 3)
-                    for c in range(componentsCount, 3):
-                        initialVector.append(0.0)
-                    initialTipCoordinates = [ (initialCoordinates[c] + initialVector[c]*pointScaleFactor) for c in range(3) ]
-                    windowCoordinates = self.project(initialTipCoordinates[0], initialTipCoordinates[1], initialTipCoordinates[2])
-                    finalTipCoordinates = self.unproject(mousePos[0], -mousePos[1], windowCoordinates[2])
-                    finalVector = [ (finalTipCoordinates[c] - initialCoordinates[c])/pointScaleFactor for c in range(3) ]
-                    result = editVectorField.assignReal(fieldcache, finalVector)
-                else:
-                    windowCoordinates = self.project(initialCoordinates[0], initialCoordinates[1], initialCoordinates[2])
-                    xa = self.unproject(self._lastMousePos[0], -self._lastMousePos[1], windowCoordinates[2])
-                    xb = self.unproject(mousePos[0], -mousePos[1], windowCoordinates[2])
-                    finalCoordinates = [ (initialCoordinates[c] + xb[c] - xa[c]) for c in range(3)]
-                    result = editCoordinateField.assignReal(fieldcache, finalCoordinates)
-            del editCoordinateField
-            del editVectorField
-            del fieldcache
-            fieldmodule.endChange()
-            self._lastMousePos = mousePos
+        if self._dragSession is not None:
+            self._dragSession.move([event.x(), event.y()])
+            if not self._dragFlushTimer.isActive():
+                self._dragFlushTimer.start()
+        elif self._regionSelectionStart is not None:
+            self._updateRegionSelection(event)
         else:
             super(DataMapperSceneviewerWidget, self).mouseMoveEvent(event)
 
+    def _flushDragSession(self):
+        if self._dragSession is not None:
+            self._dragSession.flush()
+
     def mouseReleaseEvent(self, event):
-        if self._editNode:
-            self._editNode = None
-            self._lastMousePos = None
-            self._editCoordinateField = None
-            self._editVectorField = None
+        if self._dragSession is not None:
+            self._dragFlushTimer.stop()
+            self._dragSession.end()
+            self._dragSession = None
+            if self._model is not None:
+                self._model.data_points_edited()
+        elif self._regionSelectionStart is not None:
+            self._finishRegionSelection(event)
         else:
             super(DataMapperSceneviewerWidget, self).mouseReleaseEvent(event)
@@ -0,0 +1,128 @@
+from opencmiss.zinc.field import Field
+from opencmiss.zinc.result import RESULT_OK as ZINC_RESULT_OK
+
+from ..utils import affine
+
+
+class DragEditSession(object):
+    """
+    State of one datapoint drag, created on mouse press and ended on release. The field cache, any
+    rectangular cartesian conversion fields and the window depth of the point are set up once; mouse moves
+    only record the latest position, and flush() writes the accumulated displacement in one change block.
+    """
+
+    def __init__(self, sceneviewer_widget, node, graphics, mouse_position):
+        self._sceneviewer_widget = sceneviewer_widget
+        self._fieldmodule = node.getNodeset().getFieldmodule()
+        self._fieldcache = self._fieldmodule.createFieldcache()
+        self._fieldcache.setNode(node)
+        self._last_position = mouse_position
+        self._pending_position = None
+        self._valid = False
+        self._edit_vector_field = None
+
+        coordinate_field = graphics.getCoordinateField()
+        self._edit_coordinate_field = self._get_rectangular_cartesian_field(coordinate_field)
+        components_count = coordinate_field.getNumberOfComponents()
+        result, coordinates = self._edit_coordinate_field.evaluateReal(self._fieldcache, 3)
+        if result != ZINC_RESULT_OK:
+            return
+        self._coordinates = coordinates + [0.0] * (3 - components_count)
+
+        point_attr = graphics.getGraphicspointattributes()
+        vector_field = point_attr.getOrientationScaleField()
+        point_base_size = point_attr.getBaseSize(3)[1][0]
+        self._point_scale_factor = point_attr.getScaleFactors(3)[1][0]
+        if vector_field.isValid() and (vector_field.getNumberOfComponents() == components_count) \
+                and (point_base_size == 0.0) and (self._point_scale_factor != 0.0):
+            # Dragging the tip of a vector glyph edits the vector rather than the point.
+            self._edit_vector_field = self._get_rectangular_cartesian_field(vector_field, coordinate_field)
+            result, vector = self._edit_vector_field.evaluateReal(self._fieldcache, 3)
+            if result != ZINC_RESULT_OK:
+                return
+            vector = vector + [0.0] * (3 - components_count)
+            tip = [self._coordinates[c] + vector[c] * self._point_scale_factor for c in range(3)]
+            self._window_depth = sceneviewer_widget.project(tip[0], tip[1], tip[2])[2]
+        else:
+            self._window_depth = sceneviewer_widget.project(
+                self._coordinates[0], self._coordinates[1], self._coordinates[2])[2]
+        self._valid = True
+
+    def _get_rectangular_cartesian_field(self, field, coordinate_field=None):
+        if field.getCoordinateSystemType() == Field.COORDINATE_SYSTEM_TYPE_RECTANGULAR_CARTESIAN:
+            return field
+        if coordinate_field is None:
+            edit_field = self._fieldmodule.createFieldCoordinateTransformation(field)
+        else:
+            edit_field = self._fieldmodule.createFieldVectorCoordinateTransformation(field, coordinate_field)
+        edit_field.setCoordinateSystemType(Field.COORDINATE_SYSTEM_TYPE_RECTANGULAR_CARTESIAN)
+        return edit_field
+
+    def get_coordinates(self):
+        """
+        :return: Rectangular cartesian coordinates of the node when the session started, or None if invalid.
+        """
+        return self._coordinates if self._valid else None
+
+    def move(self, mouse_position):
+        self._pending_position = mouse_position
+
+    def flush(self):
+        """
+        Write the displacement since the last flush back to the field.
+        """
+        if not self._valid or (self._pending_position is None):
+            return
+        position = self._pending_position
+        self._pending_position = None
+        self._fieldmodule.beginChange()
+        if self._edit_vector_field is not None:
+            tip = self._sceneviewer_widget.unproject(position[0], -position[1], self._window_depth)
+            vector = [(tip[c] - self._coordinates[c]) / self._point_scale_factor for c in range(3)]
+            self._edit_vector_field.assignReal(self._fieldcache, vector)
+        else:
+            xa = self._sceneviewer_widget.unproject(self._last_position[0], -self._last_position[1],
+                                                    self._window_depth)
+            xb = self._sceneviewer_widget.unproject(position[0], -position[1], self._window_depth)
+            self._coordinates = [self._coordinates[c] + xb[c] - xa[c] for c in range(3)]
+            self._edit_coordinate_field.assignReal(self._fieldcache, self._coordinates)
+        self._fieldmodule.endChange()
+        self._last_position = position
+
+    def end(self):
+        self.flush()
+        self._edit_coordinate_field = None
+        self._edit_vector_field = None
+        self._fieldcache = None
+
+
+class GroupDragSession(object):
+    """
+    Drag of a whole selected group of datapoints. Their coordinates are gathered once on mouse press into a
+    DataPointBlock; each flush translates the gathered coordinates by the total screen displacement, unprojected
+    at the depth of the picked point, and writes the group back in one change block.
+    """
+
+    def __init__(self, sceneviewer_widget, block, anchor_coordinates, mouse_position):
+        self._sceneviewer_widget = sceneviewer_widget
+        self._block = block
+        self._start_position = mouse_position
+        self._pending_position = None
+        self._window_depth = sceneviewer_widget.project(
+            anchor_coordinates[0], anchor_coordinates[1], anchor_coordinates[2])[2]
+
+    def move(self, mouse_position):
+        self._pending_position = mouse_position
+
+    def flush(self):
+        if self._pending_position is None:
+            return
+        position = self._pending_position
+        self._pending_position = None
+        xa = self._sceneviewer_widget.unproject(self._start_position[0], -self._start_position[1], self._window_depth)
+        xb = self._sceneviewer_widget.unproject(position[0], -position[1], self._window_depth)
+        self._block.transform(affine.translation_matrix([xb[c] - xa[c] for c in range(3)]))
+
+    def end(self):
+        self.flush()
+        self._block = None
@@ -1,8 +1,17 @@
+import math
+
 from PySide import QtCore, QtGui
 
+from opencmiss.zinc.sceneviewer import Sceneviewerevent
+
 from .ui_scaffolddatamapperwidget import Ui_ScaffoldDataMapper
 from .datamappersceneviewerwidget import DataMapperSceneviewerWidget
 
+# Transformation control changes are coalesced and applied at most once per display frame.
+TRANSFORM_UPDATE_INTERVAL_MS = 16
+# Interval between frames of time sequence playback.
+PLAYBACK_INTERVAL_MS = 40
+
 
 class ScaffoldDataMapperWidget(QtGui.QWidget):
 
@@ -13,33 +22,109 @@ class ScaffoldDataMapperWidget(QtGui.QWidget):
         self._ui = Ui_ScaffoldDataMapper()
         self._ui.setupUi(self)
         self._ui.sceneviewerWidget.setContext(self._model.get_context())
+        self._ui.sceneviewerWidget.set_generator_model(self._model)
 
         self._done_callback = None
+        self._scene_viewer_notifier = None
         self._settings = {'view-parameters': {}}
+        self._transform_spin_boxes = {
+            'yaw': self._ui.yaw_doubleSpinBox,
+            'pitch': self._ui.pitch_doubleSpinBox,
+            'roll': self._ui.roll_doubleSpinBox,
+            'X': self._ui.positionX_doubleSpinBox,
+            'Y': self._ui.positionY_doubleSpinBox,
+            'Z': self._ui.positionZ_doubleSpinBox,
+        }
+        self._pending_transform_controls = set()
+        self._transform_timer = QtCore.QTimer(self)
+        self._transform_timer.setSingleShot(True)
+        self._transform_timer.setInterval(TRANSFORM_UPDATE_INTERVAL_MS)
+        self._transform_timer.timeout.connect(self._apply_scheduled_transform)
+        self._playback_timer = QtCore.QTimer(self)
+        self._playback_timer.setInterval(PLAYBACK_INTERVAL_MS)
+        self._playback_timer.timeout.connect(self._play_next_time_point)
+        self._time_sequence_loaded = False
         self._model.set_model_settings_change_callback(self._setting_display)
+        self._model.set_time_point_change_callback(self._display_time_point)
+        self._model.set_scaffold_preview_mode(True)
+        # A model reused from an earlier execution keeps its scaffold pose.
+        self._setting_display()
         self._make_connections()
+        self._initialise_time_sequence()
 
     def _make_connections(self):
         self._ui.sceneviewerWidget.graphicsInitialized.connect(self._graphics_initialized)
         self._ui.doneButton.clicked.connect(self._done_clicked)
         self._ui.viewAllButton.clicked.connect(self._view_all)
+        self._ui.alignResetButton.clicked.connect(self._reset_clicked)
         self._ui.yaw_doubleSpinBox.valueChanged.connect(self._yaw_clicked)
         self._ui.pitch_doubleSpinBox.valueChanged.connect(self._pitch_clicked)
         self._ui.roll_doubleSpinBox.valueChanged.connect(self._roll_clicked)
         self._ui.positionX_doubleSpinBox.valueChanged.connect(self._x_clicked)
         self._ui.positionY_doubleSpinBox.valueChanged.connect(self._y_clicked)
         self._ui.positionZ_doubleSpinBox.valueChanged.connect(self._z_clicked)
+        self._ui.rateOfChange_horizontalSlider.valueChanged.connect(self._setting_display)
         self._ui.manualMapping_radioButton.clicked.connect(self._manual_mapping_selected)
         self._ui.automaticMapping_radioButton.clicked.connect(self._auto_mapping_selected)
+        self._ui.map_pushButton.clicked.connect(self._map_clicked)
+        self._ui.timePoint_spinBox.valueChanged.connect(self._time_point_changed)
+        self._ui.timePlay_pushButton.toggled.connect(self._play_toggled)
         self._ui.createNode_checkBox.clicked.connect(self._create_node_selected)
         self._ui.checkBox.clicked.connect(self._select_node_selected)
 
+    def _initialise_time_sequence(self):
+        has_time_sequence = self._model.has_time_sequence()
+        self._ui.timeSeries_groupBox.setEnabled(has_time_sequence)
+        self._ui.timePoint_label.setEnabled(has_time_sequence)
+        self._ui.timePoint_spinBox.setEnabled(has_time_sequence)
+        self._ui.timePlay_pushButton.setEnabled(has_time_sequence)
+
+    def _load_time_sequence(self):
+        """
+        Load the time sequence the first time the time controls are used, as it may convert the ephys file.
+        """
+        if self._time_sequence_loaded:
+            return
+        self._time_sequence_loaded = True
+        QtGui.QApplication.setOverrideCursor(QtCore.Qt.WaitCursor)
+        try:
+            number_of_time_points = self._model.get_number_of_time_points()
+        finally:
+            QtGui.QApplication.restoreOverrideCursor()
+        spin_box = self._ui.timePoint_spinBox
+        blocked = spin_box.blockSignals(True)
+        spin_box.setMaximum(max(0, number_of_time_points - 1))
+        spin_box.blockSignals(blocked)
+
+    def _time_point_changed(self, value):
+        self._load_time_sequence()
+        # The value may have been clamped to the number of time points just loaded.
+        self._model.set_time_point(self._ui.timePoint_spinBox.value())
+
+    def _display_time_point(self, time_point):
+        spin_box = self._ui.timePoint_spinBox
+        blocked = spin_box.blockSignals(True)
+        spin_box.setValue(time_point)
+        spin_box.blockSignals(blocked)
+
+    def _play_toggled(self, checked):
+        if checked:
+            self._load_time_sequence()
+            self._playback_timer.start()
+        else:
+            self._playback_timer.stop()
+
+    def _play_next_time_point(self):
+        self._model.advance_time_point()
+
     def _graphics_initialized(self):
         scene_viewer = self._ui.sceneviewerWidget.getSceneviewer()
 
         if scene_viewer is not None:
             scene = self._model.get_scene()
             self._ui.sceneviewerWidget.setScene(scene)
+            self._scene_viewer_notifier = scene_viewer.createSceneviewernotifier()
+            self._scene_viewer_notifier.setCallback(self._scene_viewer_event)
 
             if len(self._settings['view-parameters']) == 0:
                 self._view_all()
@@ -51,56 +136,92 @@ class ScaffoldDataMapperWidget(QtGui.QWidget):
                 self._ui.sceneviewerWidget.setViewParameters(eye, look_at, up, angle)
                 self._view_all()
 
+    def _scene_viewer_event(self, event):
+        if event.getChangeFlags() & Sceneviewerevent.CHANGE_FLAG_TRANSFORM:
+            view_parameters = self._ui.sceneviewerWidget.getViewParameters()
+            if view_parameters is None:
+                return
+            eye, look_at, _, angle = view_parameters
+            distance = math.sqrt(sum((eye[c] - look_at[c]) ** 2 for c in range(3)))
+            # The view angle is in radians.
+            view_size = 2.0 * distance * math.tan(angle / 2.0)
+            self._model.update_data_level_of_detail(view_size)
+
     def _view_all(self):
         if self._ui.sceneviewerWidget.getSceneviewer() is not None:
             self._ui.sceneviewerWidget.viewAll()
 
     def _done_clicked(self):
+        if self._transform_timer.isActive():
+            self._transform_timer.stop()
+            self._apply_scheduled_transform()
+        self._ui.timePlay_pushButton.setChecked(False)
+        self._model.set_scaffold_preview_mode(False)
         self._done_callback()
 
     def register_done_execution(self, done_callback):
         self._done_callback = done_callback
 
+    def _reset_clicked(self):
+        self._transform_timer.stop()
+        self._pending_transform_controls = set()
+        self._model.reset_scaffold()
+
     def _yaw_clicked(self):
-        value = self._ui.yaw_doubleSpinBox.value()
-        self._model.rotate_scaffold('yaw', value)
+        self._schedule_transform('yaw')
 
     def _pitch_clicked(self):
-        value = self._ui.pitch_doubleSpinBox.value()
-        self._model.rotate_scaffold('pitch', value)
+        self._schedule_transform('pitch')
 
     def _roll_clicked(self):
-        value = self._ui.roll_doubleSpinBox.value()
-        self._model.rotate_scaffold('roll', value)
+        self._schedule_transform('roll')
 
     def _x_clicked(self):
-        value = self._ui.positionX_doubleSpinBox.value()
-        rate = self._ui.rateOfChange_horizontalSlider.value()
-        self._model.translate_scaffold('X', value, rate)
+        self._schedule_transform('X')
 
     def _y_clicked(self):
-        value = self._ui.positionY_doubleSpinBox.value()
-        rate = self._ui.rateOfChange_horizontalSlider.value()
-        self._model.translate_scaffold('Y', value, rate)
+        self._schedule_transform('Y')
 
     def _z_clicked(self):
-        value = self._ui.positionZ_doubleSpinBox.value()
+        self._schedule_transform('Z')
+
+    def _schedule_transform(self, name):
+        """
+        Record that a transformation control changed and apply all changes together at the next frame.
+        Intermediate values are never applied: the latest value of each control is read when the timer fires.
+        """
+        self._pending_transform_controls.add(name)
+        if not self._transform_timer.isActive():
+            self._transform_timer.start()
+
+    def _apply_scheduled_transform(self):
+        controls = self._pending_transform_controls
+        self._pending_transform_controls = set()
+        angles = dict((name, self._transform_spin_boxes[name].value())
+                      for name in ['yaw', 'pitch', 'roll'] if name in controls)
+        positions = dict((name, self._transform_spin_boxes[name].value())
+                         for name in ['X', 'Y', 'Z'] if name in controls)
         rate = self._ui.rateOfChange_horizontalSlider.value()
-        self._model.translate_scaffold('Z', value, rate)
+        self._model.transform_scaffold(angles, positions, rate)
 
     def _setting_display(self):
         self._display_real(self._ui.yaw_doubleSpinBox, self._model.get_model_yaw_value())
         self._display_real(self._ui.pitch_doubleSpinBox, self._model.get_model_pitch_value())
         self._display_real(self._ui.roll_doubleSpinBox, self._model.get_model_roll_value())
-        self._display_real(self._ui.positionX_doubleSpinBox, self._model.get_model_X_value())
-        self._display_real(self._ui.positionY_doubleSpinBox, self._model.get_model_Y_value())
-        self._display_real(self._ui.positionZ_doubleSpinBox, self._model.get_model_Z_value())
+        # The model holds the offset, which the position controls set in steps scaled by the rate.
+        rate = self._ui.rateOfChange_horizontalSlider.value()
+        self._display_real(self._ui.positionX_doubleSpinBox, self._model.get_model_X_value() / rate)
+        self._display_real(self._ui.positionY_doubleSpinBox, self._model.get_model_Y_value() / rate)
+        self._display_real(self._ui.positionZ_doubleSpinBox, self._model.get_model_Z_value() / rate)
 
     @staticmethod
     def _display_real(widget, value):
         new_text = '{:.4g}'.format(value)
         if isinstance(widget, QtGui.QDoubleSpinBox):
+            # Do not feed displayed model settings back into the model as new edits.
+            blocked = widget.blockSignals(True)
             widget.setValue(value)
+            widget.blockSignals(blocked)
         else:
             widget.setText(new_text)
 
@@ -121,3 +242,11 @@ class ScaffoldDataMapperWidget(QtGui.QWidget):
     def _auto_mapping_selected(self):
         if self._ui.automaticMapping_radioButton.isChecked():
             self._ui.createNode_checkBox.setEnabled(False)
+
+    def _map_clicked(self):
+        if self._ui.automaticMapping_radioButton.isChecked():
+            QtGui.QApplication.setOverrideCursor(QtCore.Qt.WaitCursor)
+            try:
+                self._model.map_data_automatically()
+            finally:
+                QtGui.QApplication.restoreOverrideCursor()
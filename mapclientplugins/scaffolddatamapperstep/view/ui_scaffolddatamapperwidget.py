@@ -194,8 +194,13 @@ class Ui_ScaffoldDataMapper(object):
         self.timePoint_spinBox.setMaximum(1000000000)
         self.timePoint_spinBox.setObjectName("timePoint_spinBox")
         self.gridLayout_5.addWidget(self.timePoint_spinBox, 1, 0, 1, 1)
+        self.timePlay_pushButton = QtGui.QPushButton(self.timeSeries_groupBox)
+        self.timePlay_pushButton.setEnabled(False)
+        self.timePlay_pushButton.setCheckable(True)
+        self.timePlay_pushButton.setObjectName("timePlay_pushButton")
+        self.gridLayout_5.addWidget(self.timePlay_pushButton, 1, 1, 1, 1)
         spacerItem = QtGui.QSpacerItem(40, 20, QtGui.QSizePolicy.Expanding, QtGui.QSizePolicy.Minimum)
-        self.gridLayout_5.addItem(spacerItem, 1, 1, 1, 1)
+        self.gridLayout_5.addItem(spacerItem, 1, 2, 1, 1)
         self.verticalLayout_17.addWidget(self.timeSeries_groupBox)
         self.gridLayout_7.addWidget(self.modifyOptions_frame, 1, 0, 1, 1)
         self.transformation_groupBox = QtGui.QGroupBox(self.scaffoldFrame)
@@ -467,6 +472,7 @@ class Ui_ScaffoldDataMapper(object):
         self.label.setText(QtGui.QApplication.translate("ScaffoldDataMapper", "- including neurite, ephys, RNA-Seq", None, QtGui.QApplication.UnicodeUTF8))
         self.timeSeries_groupBox.setTitle(QtGui.QApplication.translate("ScaffoldDataMapper", "Time Sequence (active when temporal data is available)", None, QtGui.QApplication.UnicodeUTF8))
         self.timePoint_label.setText(QtGui.QApplication.translate("ScaffoldDataMapper", "Toggle time for data cloud", None, QtGui.QApplication.UnicodeUTF8))
+        self.timePlay_pushButton.setText(QtGui.QApplication.translate("ScaffoldDataMapper", "Play", None, QtGui.QApplication.UnicodeUTF8))
         self.transformation_groupBox.setTitle(QtGui.QApplication.translate("ScaffoldDataMapper", "Edit Scaffold Transformation:", None, QtGui.QApplication.UnicodeUTF8))
         self.position_label.setText(QtGui.QApplication.translate("ScaffoldDataMapper", "Postions:", None, QtGui.QApplication.UnicodeUTF8))
         self.pitch_label.setText(QtGui.QApplication.translate("ScaffoldDataMapper", "Pitch", None, QtGui.QApplication.UnicodeUTF8))
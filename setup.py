@@ -50,4 +50,9 @@ setup(name='mapclientplugins.scaffolddatamapperstep',
     include_package_data=True,
     zip_safe=False,
     install_requires=requires,
+    entry_points={
+      'console_scripts': [
+          'scaffolddatamapper-batch=mapclientplugins.scaffolddatamapperstep.batch:main',
+      ],
+    },
     )
@@ -0,0 +1,61 @@
+import importlib
+import itertools
+
+import pytest
+
+try:
+    importlib.import_module('opencmiss.zinc.context')
+    ZINC_AVAILABLE = True
+except ImportError:
+    ZINC_AVAILABLE = False
+
+
+def pytest_collection_modifyitems(config, items):
+    if ZINC_AVAILABLE:
+        return
+    skip_zinc = pytest.mark.skip(reason='needs opencmiss.zinc, which is not installed')
+    for item in items:
+        if 'zinc' in item.keywords:
+            item.add_marker(skip_zinc)
+
+
+@pytest.fixture
+def zinc_context():
+    from opencmiss.zinc.context import Context
+    return Context('test')
+
+
+@pytest.fixture
+def cube_scaffold_path(tmpdir, zinc_context):
+    """
+    :return: Path of an EX file holding a unit cube scaffold of one trilinear element.
+    """
+    from opencmiss.zinc.element import Element, Elementbasis
+    from opencmiss.zinc.field import Field
+
+    region = zinc_context.createRegion()
+    fm = region.getFieldmodule()
+    fm.beginChange()
+    coordinates = fm.createFieldFiniteElement(3)
+    coordinates.setName('coordinates')
+    coordinates.setManaged(True)
+    coordinates.setTypeCoordinate(True)
+    nodes = fm.findNodesetByFieldDomainType(Field.DOMAIN_TYPE_NODES)
+    node_template = nodes.createNodetemplate()
+    node_template.defineField(coordinates)
+    cache = fm.createFieldcache()
+    # Nodes in xi order, x varying fastest.
+    for identifier, (z, y, x) in enumerate(itertools.product([0.0, 1.0], repeat=3), 1):
+        cache.setNode(nodes.createNode(identifier, node_template))
+        coordinates.assignReal(cache, [x, y, z])
+    mesh = fm.findMeshByDimension(3)
+    element_template = mesh.createElementtemplate()
+    element_template.setElementShapeType(Element.SHAPE_TYPE_CUBE)
+    eft = mesh.createElementfieldtemplate(fm.createElementbasis(3, Elementbasis.FUNCTION_TYPE_LINEAR_LAGRANGE))
+    element_template.defineField(coordinates, -1, eft)
+    element = mesh.createElement(1, element_template)
+    element.setNodesByIdentifier(eft, list(range(1, 9)))
+    fm.endChange()
+    path = str(tmpdir.join('cube.exf'))
+    region.writeFile(path)
+    return path
@@ -0,0 +1,20 @@
+import numpy as np
+
+from mapclientplugins.scaffolddatamapperstep.utils import affine
+
+
+def test_euler_angles_inverts_rotation_matrix():
+    angles = [30.0, -20.0, 75.0]
+    assert np.allclose(affine.euler_angles(affine.rotation_matrix(angles)), angles)
+
+
+def test_to_zinc_matrix_row_major():
+    matrix = np.array([[1.0, 2.0, 3.0, 4.0],
+                       [5.0, 6.0, 7.0, 8.0],
+                       [9.0, 10.0, 11.0, 12.0],
+                       [0.0, 0.0, 0.0, 1.0]])
+    values = affine.to_zinc_matrix(matrix)
+    # Rows one after the other, so the translation column is at indexes 3, 7 and 11.
+    assert values == [1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0, 8.0, 9.0, 10.0, 11.0, 12.0, 0.0, 0.0, 0.0, 1.0]
+    point = [0.5, -1.0, 2.0, 1.0]
+    assert np.allclose(np.reshape(values, (4, 4)).dot(point), matrix.dot(point))
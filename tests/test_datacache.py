@@ -0,0 +1,40 @@
+import os
+
+import numpy as np
+
+from mapclientplugins.scaffolddatamapperstep.utils.datacache import DataCache
+
+
+def _commit(cache, file_path, coordinates):
+    writer = cache.create_writer(file_path)
+    writer.append(np.arange(1, len(coordinates) + 1), coordinates)
+    return writer
+
+
+def test_concurrent_commits_of_same_entry(tmpdir):
+    source = tmpdir.join('data.exf')
+    source.write('data')
+    cache = DataCache(str(tmpdir.join('cache')))
+    coordinates = np.arange(12.0).reshape(4, 3)
+    first = _commit(cache, str(source), coordinates)
+    second = _commit(cache, str(source), coordinates)
+    first.commit('coordinates', ['x', 'y', 'z'], None, {'marker': [[1, 2]]})
+    second.commit('coordinates', ['x', 'y', 'z'], None, {'marker': [[1, 2]]})
+    metadata, identifiers, loaded = cache.load(str(source))
+    assert identifiers.tolist() == [1, 2, 3, 4]
+    assert np.array_equal(loaded, coordinates)
+    assert metadata['groups'] == {'marker': [[1, 2]]}
+    assert os.listdir(str(tmpdir.join('cache'))) == [os.path.basename(cache._get_entry_directory(str(source)))]
+
+
+def test_outdated_entry_is_replaced(tmpdir):
+    source = tmpdir.join('data.exf')
+    source.write('data')
+    cache = DataCache(str(tmpdir.join('cache')))
+    _commit(cache, str(source), np.zeros((2, 3))).commit('coordinates', ['x', 'y', 'z'], None)
+    source.write('changed data')
+    assert cache.load(str(source)) is None
+    _commit(cache, str(source), np.ones((3, 3))).commit('coordinates', ['x', 'y', 'z'], None)
+    _, identifiers, coordinates = cache.load(str(source))
+    assert len(identifiers) == 3
+    assert np.array_equal(coordinates, np.ones((3, 3)))
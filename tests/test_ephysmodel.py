@@ -0,0 +1,46 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from mapclientplugins.scaffolddatamapperstep.model.ephysmodel import EphysModel
+from mapclientplugins.scaffolddatamapperstep.utils.columnstore import ColumnStoreWriter
+
+
+def _model(tmpdir, name, text, chunk_rows=2):
+    path = tmpdir.join(name)
+    path.write(text)
+    return EphysModel(str(path), cache_directory=str(tmpdir.join('cache')), chunk_rows=chunk_rows)
+
+
+def test_convert_csv_with_labels_and_large_integers(tmpdir):
+    model = _model(tmpdir, 'ephys.csv', 'time,1,2,label\n0.0,1,5000000000,a\n0.5,2,7,b\n1.0,3.5,8,\n')
+    assert model.get_channel_names() == ['1', '2', 'label']
+    assert np.allclose(model.get_times(), [0.0, 0.5, 1.0])
+    # Promoted to float by the non-integer value in the second chunk.
+    assert model.get_channel('1').dtype == np.float32
+    assert np.allclose(model.get_channel('1'), [1.0, 2.0, 3.5])
+    # Out of the int32 range, so stored as float.
+    assert np.allclose(model.get_channel('2'), [5.0e9, 7.0, 8.0])
+    assert np.isnan(model.get_channel('label')).all()
+
+
+def test_convert_json_object_of_values(tmpdir):
+    model = _model(tmpdir, 'ephys.json', json.dumps({'t': 0.25, '3': 4}))
+    assert model.get_number_of_samples() == 1
+    assert model.get_channel('3').tolist() == [4]
+
+
+def test_convert_json_mismatched_channels(tmpdir):
+    model = _model(tmpdir, 'ephys.json', json.dumps({'1': [1, 2], '2': [3]}))
+    with pytest.raises(ValueError):
+        model.get_channel_names()
+
+
+def test_failed_conversion_leaves_no_store(tmpdir):
+    directory = str(tmpdir.join('store'))
+    writer = ColumnStoreWriter(directory, ['1'])
+    writer.append([[1, 2]])
+    writer.discard()
+    assert os.listdir(str(tmpdir)) == []
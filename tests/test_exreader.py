@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+
+from mapclientplugins.scaffolddatamapperstep.utils.exreader import ExFormatError, ExStreamReader
+
+V1_HEADER = """ Group name: cloud
+ #Fields=1
+ 1) data_coordinates, coordinate, rectangular cartesian, #Components=3
+   x.  Value index=1, #Derivatives=0
+   y.  Value index=2, #Derivatives=0
+   z.  Value index=3, #Derivatives=0
+"""
+
+V3_HEADER = """EX Version: 3
+Region: /
+!#nodeset datapoints
+Define node template: node1
+Shape. Dimension=0
+#Fields=1
+1) data_coordinates, coordinate, rectangular cartesian, real, #Components=3
+ x. #Values=1 (value)
+ y. #Values=1 (value)
+ z. #Values=1 (value)
+Node template: node1
+"""
+
+
+def _write(tmpdir, text):
+    path = tmpdir.join('data.exf')
+    path.write(text)
+    return str(path)
+
+
+def _nodes(count):
+    return ''.join('Node: {0}\n {1} {2} {3}\n'.format(i + 1, i, 2.0 * i, -i) for i in range(count))
+
+
+def _read_all(reader):
+    identifiers = []
+    coordinates = []
+    for batch_identifiers, batch_coordinates in reader.iterate_batches():
+        identifiers.append(batch_identifiers.copy())
+        coordinates.append(batch_coordinates.copy())
+    return np.concatenate(identifiers), np.concatenate(coordinates)
+
+
+@pytest.mark.parametrize('header, group_name', [(V1_HEADER, 'cloud'), (V3_HEADER, None)])
+def test_header(tmpdir, header, group_name):
+    reader = ExStreamReader(_write(tmpdir, header + _nodes(5)), chunk_size=2)
+    identifiers, coordinates = _read_all(reader)
+    assert identifiers.tolist() == [1, 2, 3, 4, 5]
+    assert coordinates[3].tolist() == [3.0, 6.0, -3.0]
+    assert reader.get_field_definition() == ('data_coordinates', ['x', 'y', 'z'], group_name)
+
+
+def test_trailing_groups(tmpdir):
+    text = V3_HEADER + _nodes(8) + """Group name: marker
+!#nodeset datapoints
+Node group:
+1..3,5
+8
+Group name: other
+!#nodeset datapoints
+Node group:
+2
+"""
+    reader = ExStreamReader(_write(tmpdir, text))
+    identifiers, _ = _read_all(reader)
+    assert len(identifiers) == 8
+    assert reader.get_groups() == {'marker': [[1, 3], [5, 5], [8, 8]], 'other': [[2, 2]]}
+
+
+def test_progress_counts_bytes(tmpdir):
+    text = u'EX Version: 3\n! µm\n' + V3_HEADER.split('\n', 1)[1] + _nodes(3)
+    path = tmpdir.join('data.exf')
+    path.write_binary(text.encode('utf-8'))
+    progress = []
+    _read_all(ExStreamReader(str(path), progress_callback=lambda done, total: progress.append((done, total))))
+    assert progress[-1] == (path.size(), path.size())
+
+
+@pytest.mark.parametrize('nodes', [
+    'Node: 1\n 1.0 2.0 abc\n',
+    'Node: one\n 1.0 2.0 3.0\n',
+    'Node: 1\n 1.0 2.0 3.0 4.0\n',
+    'Node: 1\n 1.0 2.0\n',
+])
+def test_bad_values(tmpdir, nodes):
+    reader = ExStreamReader(_write(tmpdir, V3_HEADER + nodes))
+    with pytest.raises(ExFormatError):
+        _read_all(reader)
+
+
+@pytest.mark.parametrize('text', [
+    V3_HEADER.replace('#Values=1 (value)', '#Values=2 (value,d/ds1)') + 'Node: 1\n 1 0 2 0 3 0\n',
+    V3_HEADER + _nodes(2) + 'Group name: marker\n!#mesh mesh1d\nElement group:\n1\n',
+    V3_HEADER,
+])
+def test_unsupported_content(tmpdir, text):
+    with pytest.raises(ExFormatError):
+        _read_all(ExStreamReader(_write(tmpdir, text)))
@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pytest
+
+# The measurement imports these in a fresh interpreter, as MAP Client has before loading the plugin.
+pytest.importorskip('PySide')
+pytest.importorskip('mapclient')
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tools'))
+
+import check_import_time  # noqa: E402
+
+
+def test_plugin_import_budget():
+    _, problems = check_import_time.check_import(check_import_time.DEFAULT_BUDGET, repeats=3)
+    assert problems == []
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+pytestmark = pytest.mark.zinc
+
+
+class _Datapoints(object):
+    """
+    Datapoints 1 to 3 with coordinates and datapoint 4 without, for the mapping model.
+    """
+
+    def __init__(self, context):
+        from opencmiss.zinc.field import Field
+        region = context.createRegion()
+        fm = region.getFieldmodule()
+        fm.beginChange()
+        self._coordinates = fm.createFieldFiniteElement(3)
+        self._coordinates.setName('data_coordinates')
+        datapoints = fm.findNodesetByFieldDomainType(Field.DOMAIN_TYPE_DATAPOINTS)
+        node_template = datapoints.createNodetemplate()
+        node_template.defineField(self._coordinates)
+        cache = fm.createFieldcache()
+        for identifier, point in enumerate([[0.2, 0.3, 0.4], [1.5, 0.5, 0.5], [0.5, 0.5, -2.0]], 1):
+            cache.setNode(datapoints.createNode(identifier, node_template))
+            self._coordinates.assignReal(cache, point)
+        datapoints.createNode(4, datapoints.createNodetemplate())
+        fm.endChange()
+
+    def get_data_coordinates(self):
+        from mapclientplugins.scaffolddatamapperstep.model.datamodel import DataModel
+        return DataModel.get_field_values(self._coordinates)
+
+
+@pytest.mark.parametrize('refine', [False, True])
+def test_map_data_reports_undefined_datapoint_unmapped(zinc_context, cube_scaffold_path, refine):
+    from mapclientplugins.scaffolddatamapperstep.model.mappingmodel import MappingModel, \
+        UNMAPPED_ELEMENT_IDENTIFIER
+    from mapclientplugins.scaffolddatamapperstep.model.scaffoldmodel import ScaffoldModel
+    scaffold_model = ScaffoldModel(zinc_context.createRegion(), zinc_context.getMaterialmodule(), cube_scaffold_path)
+    mapping_model = MappingModel(scaffold_model, _Datapoints(zinc_context))
+    data_identifiers, element_identifiers, xi = mapping_model.map_data(samples_per_xi=5, refine=refine)
+    assert data_identifiers.tolist() == [1, 2, 3, 4]
+    assert element_identifiers.tolist() == [1, 1, 1, UNMAPPED_ELEMENT_IDENTIFIER]
+    assert np.isnan(xi[3]).all()
+    if refine:
+        # The unit cube's xi are its coordinates, clamped to the element for points outside it.
+        assert np.allclose(xi[:3], [[0.2, 0.3, 0.4], [1.0, 0.5, 0.5], [0.5, 0.5, 0.0]])
+    else:
+        assert np.isfinite(xi[:3]).all()
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from mapclientplugins.scaffolddatamapperstep.utils import affine
+
+pytestmark = pytest.mark.zinc
+
+DATA = """EX Version: 3
+Region: /
+!#nodeset datapoints
+Define node template: node1
+Shape. Dimension=0
+#Fields=1
+1) data_coordinates, coordinate, rectangular cartesian, real, #Components=3
+ x. #Values=1 (value)
+ y. #Values=1 (value)
+ z. #Values=1 (value)
+Node template: node1
+Node: 1
+ 0.25 0.5 0.75
+Node: 2
+ 1.5 0.5 -1.0
+"""
+
+
+def _select_all_data(model):
+    from opencmiss.zinc.field import Field
+    fm = model.get_region().getFieldmodule()
+    datapoints = fm.findNodesetByFieldDomainType(Field.DOMAIN_TYPE_DATAPOINTS)
+    selection_group = fm.createFieldGroup()
+    nodeset_group = selection_group.createFieldNodeGroup(datapoints).getNodesetGroup()
+    node_iter = datapoints.createNodeiterator()
+    node = node_iter.next()
+    while node.isValid():
+        nodeset_group.addNode(node)
+        node = node_iter.next()
+    return selection_group
+
+
+def test_edited_model_is_not_reused(tmpdir, cube_scaffold_path):
+    from mapclientplugins.scaffolddatamapperstep.model.modelcache import MasterModelCache
+    data_path = tmpdir.join('data.exf')
+    data_path.write(DATA)
+    cache = MasterModelCache()
+    model, created = cache.get_model(cube_scaffold_path, str(data_path))
+    assert created
+    original_coordinates, _ = model.get_data_coordinates()
+
+    # An unchanged model is reused.
+    assert cache.get_model(cube_scaffold_path, str(data_path)) == (model, False)
+
+    assert model.transform_selected_data(_select_all_data(model), affine.translation_matrix([1.0, 2.0, 3.0]))
+    edited_coordinates, _ = model.get_data_coordinates()
+    assert np.allclose(edited_coordinates, original_coordinates + [1.0, 2.0, 3.0])
+
+    new_model, created = cache.get_model(cube_scaffold_path, str(data_path))
+    assert created and (new_model is not model)
+    coordinates, identifiers = new_model.get_data_coordinates()
+    assert identifiers.tolist() == [1, 2]
+    assert np.allclose(coordinates, original_coordinates)
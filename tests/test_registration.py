@@ -0,0 +1,53 @@
+import numpy as np
+
+from mapclientplugins.scaffolddatamapperstep.utils.registration import fit_rigid_transformation, icp, \
+    transform_points, voxel_downsample
+
+
+def _known_transformation(angle, offset):
+    cos_angle, sin_angle = np.cos(angle), np.sin(angle)
+    matrix = np.identity(4)
+    matrix[:3, :3] = [[cos_angle, -sin_angle, 0.0], [sin_angle, cos_angle, 0.0], [0.0, 0.0, 1.0]]
+    matrix[:3, 3] = offset
+    return matrix
+
+
+def _cloud():
+    return np.random.RandomState(5).uniform(-10.0, 10.0, (200, 3)) * [1.0, 2.0, 3.0]
+
+
+def _sorted_rows(points):
+    return points[np.lexsort(points.T[::-1])]
+
+
+def test_voxel_downsample_centroids():
+    points = np.array([[0.1, 0.1, 0.1], [0.3, 0.5, 0.9], [1.5, 0.2, 0.2], [1.7, 0.4, 0.6], [0.5, 2.5, 0.5]])
+    centroids = voxel_downsample(points, 1.0)
+    expected = np.array([[0.2, 0.3, 0.5], [1.6, 0.3, 0.4], [0.5, 2.5, 0.5]])
+    assert np.allclose(_sorted_rows(centroids), _sorted_rows(expected))
+
+
+def test_voxel_downsample_large_grid():
+    # 1.0e7 voxels along each axis, more in total than an int64 key can address.
+    points = np.array([[0.0, 0.0, 0.0], [0.05, 0.05, 0.0], [1.0e6, 0.0, 0.0], [0.0, 1.0e6, 1.0e6],
+                       [1.0e6, 1.0e6, 1.0e6], [1.0e6, 1.0e6, 1.0e6 + 0.05]])
+    centroids = voxel_downsample(points, 0.1)
+    expected = np.array([[0.025, 0.025, 0.0], [1.0e6, 0.0, 0.0], [0.0, 1.0e6, 1.0e6],
+                         [1.0e6, 1.0e6, 1.0e6 + 0.025]])
+    assert np.allclose(_sorted_rows(centroids), _sorted_rows(expected))
+
+
+def test_fit_rigid_transformation():
+    source = _cloud()
+    matrix = _known_transformation(0.7, [1.0, -2.0, 3.0])
+    fitted = fit_rigid_transformation(source, transform_points(matrix, source))
+    assert np.allclose(fitted, matrix)
+
+
+def test_icp_recovers_small_transformation():
+    fixed = _cloud()
+    matrix = _known_transformation(0.05, [0.2, -0.1, 0.3])
+    moving = transform_points(np.linalg.inv(matrix), fixed)
+    transformation, residuals = icp(moving, fixed, max_iterations=100, tolerance=1.0e-12)
+    assert np.allclose(transformation, matrix, atol=1.0e-6)
+    assert residuals[-1] < 1.0e-6
@@ -0,0 +1,23 @@
+import numpy as np
+import pytest
+
+from mapclientplugins.scaffolddatamapperstep.utils import affine
+
+pytestmark = pytest.mark.zinc
+
+
+def _create_scaffold_model(context, file_path):
+    from mapclientplugins.scaffolddatamapperstep.model.scaffoldmodel import ScaffoldModel
+    return ScaffoldModel(context.createRegion(), context.getMaterialmodule(), file_path)
+
+
+@pytest.mark.parametrize('preview_mode', [False, True])
+def test_set_transformation_matrix_round_trip(zinc_context, cube_scaffold_path, preview_mode):
+    model = _create_scaffold_model(zinc_context, cube_scaffold_path)
+    model.set_preview_mode(preview_mode)
+    matrix = affine.translation_matrix([1.0, -2.0, 3.0]).dot(affine.rotation_matrix([30.0, -20.0, 75.0]))
+    model.set_transformation_matrix(matrix)
+    # The settings made from the matrix rebuild the same pose.
+    assert np.allclose(model.get_transformation_matrix(), matrix)
+    assert np.allclose([model.get_yaw_value(), model.get_pitch_value(), model.get_roll_value()],
+                       [30.0, -20.0, 75.0])
@@ -0,0 +1,54 @@
+import numpy as np
+
+from mapclientplugins.scaffolddatamapperstep.utils.screenselection import ScreenGridIndex, project_points
+
+# World to Zinc window pixel top left transformation of an orthographic view scaled 10 pixels per unit with
+# the world origin at window pixel (100, -100), i.e. 100 pixels right of and below the top left corner.
+WINDOW_MATRIX = [10.0, 0.0, 0.0, 100.0,
+                 0.0, 10.0, 0.0, -100.0,
+                 0.0, 0.0, 1.0, 0.0,
+                 0.0, 0.0, 0.0, 1.0]
+
+
+def test_project_points_to_mouse_coordinates():
+    points = np.array([[0.0, 0.0, 0.0], [1.0, 2.0, 0.0], [-3.0, -1.0, 5.0]])
+    window, in_front = project_points(WINDOW_MATRIX, points)
+    # Mouse y increases downward, so world y up moves points toward the top of the window.
+    assert np.allclose(window, [[100.0, 100.0], [110.0, 80.0], [70.0, 110.0]])
+    assert in_front.all()
+
+
+def test_project_points_behind_viewer():
+    matrix = np.array(WINDOW_MATRIX).reshape(4, 4)
+    # Perspective division by -z, so points with positive z are behind the viewer.
+    matrix[3] = [0.0, 0.0, -1.0, 0.0]
+    _, in_front = project_points(matrix.ravel(), np.array([[0.0, 0.0, -1.0], [0.0, 0.0, 1.0]]))
+    assert in_front.tolist() == [True, False]
+
+
+def _grid_points():
+    x, y = np.meshgrid(np.arange(10.0), np.arange(10.0), indexing='ij')
+    points = np.column_stack([x.ravel(), y.ravel(), np.zeros(x.size)])
+    window, in_front = project_points(WINDOW_MATRIX, points)
+    return points, ScreenGridIndex(window, in_front, cell_size=16.0)
+
+
+def test_query_box():
+    points, index = _grid_points()
+    # Mouse rectangle from (120, 40) down to (141, 71): world x 2..4 and world y 3..6.
+    selected = np.sort(index.query_box(141, 71, 120, 40))
+    expected = np.flatnonzero((points[:, 0] >= 2) & (points[:, 0] <= 4) & (points[:, 1] >= 3) & (points[:, 1] <= 6))
+    assert selected.tolist() == expected.tolist()
+
+
+def test_query_box_outside():
+    _, index = _grid_points()
+    assert len(index.query_box(-50, -50, -10, -10)) == 0
+
+
+def test_query_lasso():
+    points, index = _grid_points()
+    # Triangle with corners at world (0, 0), (8, 0) and (0, 8) in mouse coordinates, slightly enlarged.
+    selected = np.sort(index.query_lasso([(99.5, 100.5), (181, 100.5), (99.5, 19)]))
+    expected = np.flatnonzero(points[:, 0] + points[:, 1] <= 8)
+    assert selected.tolist() == expected.tolist()
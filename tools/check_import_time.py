@@ -0,0 +1,97 @@
+"""
+Check that importing the plugin package, as MAP Client does for every workflow, stays within an import time
+budget and does not pull in the heavy modules only needed once the step is configured or executed.
+
+Usage::
+
+    python tools/check_import_time.py [--budget SECONDS] [--repeats N]
+
+Each measurement runs in a fresh interpreter. The time of the EXCLUDED_MODULES imports, which MAP Client has
+already paid for, is measured first and excluded. Exits with status 1 if the plugin import exceeds the budget,
+a deferred module was imported or the step could not be registered. tests/test_import_time.py runs the same
+check where PySide and MAP Client are installed.
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+PACKAGE_NAME = 'mapclientplugins.scaffolddatamapperstep'
+DEFAULT_BUDGET = 0.05
+# Imported by step.py at module level, as the step derives from the mount point and loads its icon with PySide.
+# MAP Client imports them before loading any plugin, so their time is not counted against the budget.
+EXCLUDED_MODULES = [
+    'PySide.QtGui',
+    'mapclient.mountpoints.workflowstep',
+]
+# Modules that must only be imported when the step is configured or executed.
+DEFERRED_MODULES = [
+    'numpy',
+    'scipy',
+    'opencmiss.zinc',
+    'opencmiss.zincwidgets',
+    PACKAGE_NAME + '.configuredialog',
+    PACKAGE_NAME + '.model',
+    PACKAGE_NAME + '.view',
+]
+
+_MEASURE_SCRIPT = '''
+import importlib, json, sys, time
+start = time.time()
+for name in {excluded!r}:
+    importlib.import_module(name)
+baseline_end = time.time()
+import {package}
+end = time.time()
+print(json.dumps(dict(
+    baseline=baseline_end - start, plugin=end - baseline_end,
+    step_loaded='{package}.step' in sys.modules,
+    deferred=[name for name in {deferred!r} if name in sys.modules])))
+'''.format(package=PACKAGE_NAME, excluded=EXCLUDED_MODULES, deferred=DEFERRED_MODULES)
+
+
+def measure_import():
+    """
+    :return: Dict of baseline and plugin import seconds, whether the step module loaded and the deferred modules
+    that were imported, from one fresh interpreter.
+    """
+    output = subprocess.check_output([sys.executable, '-c', _MEASURE_SCRIPT])
+    return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+
+def check_import(budget=DEFAULT_BUDGET, repeats=5):
+    """
+    :return: The fastest of repeats measurements, as the least disturbed by other load on the machine, and a
+    list of messages describing each failed check.
+    """
+    best = min([measure_import() for _ in range(repeats)], key=lambda measurement: measurement['plugin'])
+    problems = []
+    if not best['step_loaded']:
+        problems.append('The step module was not imported, so the step is not registered with MAP Client')
+    if best['deferred']:
+        problems.append('Imported modules that should be deferred: {0}'.format(', '.join(best['deferred'])))
+    if best['plugin'] > budget:
+        problems.append('Plugin package import exceeds the budget')
+    return best, problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Check the import time budget of the plugin package.')
+    parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET,
+                        help='maximum seconds for importing the plugin package')
+    parser.add_argument('--repeats', type=int, default=5, help='number of fresh interpreters to measure')
+    options = parser.parse_args(argv)
+    try:
+        best, problems = check_import(options.budget, options.repeats)
+    except subprocess.CalledProcessError:
+        print('Could not import PySide, MAP Client and the plugin; run this in the MAP Client environment')
+        return 1
+    print('Baseline {0} imports: {1:.3f} s'.format(', '.join(EXCLUDED_MODULES), best['baseline']))
+    print('Plugin package import: {0:.3f} s (budget {1:.3f} s)'.format(best['plugin'], options.budget))
+    for problem in problems:
+        print(problem)
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())